@@ -1 +1,7 @@
-from .gui.MainWindow import start_gui
+def start_gui():
+    # Qt and the GUI modules are only imported when the GUI starts, see cli.py for the headless entry point
+    from .utils import StartupTimer
+    startup_timer = StartupTimer()
+    from .gui.MainWindow import start_gui
+    startup_timer.mark("imports")
+    start_gui(startup_timer)
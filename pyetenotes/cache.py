@@ -0,0 +1,239 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+logger = logging.getLogger("logger")
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS collections (
+    uid TEXT PRIMARY KEY,
+    blob BLOB NOT NULL,
+    stoken TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    uid TEXT PRIMARY KEY,
+    collection_uid TEXT NOT NULL,
+    blob BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_collection_uid ON items (collection_uid);
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT UNIQUE NOT NULL,
+    collection_uid TEXT NOT NULL,
+    blob BLOB NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS imports (
+    source TEXT NOT NULL,
+    path TEXT NOT NULL,
+    uid TEXT NOT NULL,
+    PRIMARY KEY (source, path)
+);
+"""
+
+
+class NotesCache(object):
+    # Collection and item blobs (as produced by the etebase managers' cache_save) with their sync tokens.
+    # Rows are written as they change, the connection is shared between threads behind a lock.
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+
+    def get_state(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: Optional[str]):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    def save_collections(self, collections: Iterable[Tuple[str, bytes]], removed: Iterable[str] = ()):
+        removed = [(uid,) for uid in removed]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO collections (uid, blob) VALUES (?, ?) ON CONFLICT (uid) DO UPDATE SET blob = excluded.blob",
+                collections
+            )
+            self.connection.executemany("DELETE FROM items WHERE collection_uid = ?", removed)
+            self.connection.executemany("DELETE FROM collections WHERE uid = ?", removed)
+
+    def save_items(self, collection_uid: str, items: Iterable[Tuple[str, bytes]], removed: Iterable[str] = (), stoken: str = None):
+        # Items, removals and the collection's sync token are written in one transaction so they stay consistent.
+        # Items with a queued local change keep it, their upload conflicts with the fetched revision.
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO items (uid, collection_uid, blob) SELECT ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM outbox WHERE uid = ?)",
+                [(uid, collection_uid, blob, uid) for uid, blob in items]
+            )
+            self.connection.executemany(
+                "DELETE FROM items WHERE uid = ? AND NOT EXISTS (SELECT 1 FROM outbox WHERE outbox.uid = items.uid)",
+                [(uid,) for uid in removed]
+            )
+            if stoken is not None:
+                self.connection.execute("UPDATE collections SET stoken = ? WHERE uid = ?", (stoken, collection_uid))
+
+    def iter_collections(self) -> Iterator[Tuple[str, bytes, Optional[str]]]:
+        with self.lock:
+            rows = self.connection.execute("SELECT uid, blob, stoken FROM collections").fetchall()
+        yield from rows
+
+    def iter_items(self, chunksize: int = 500) -> Iterator[Tuple[str, str, bytes]]:
+        # Stream (collection_uid, uid, blob) rows without loading the whole table
+        last_rowid = 0
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    "SELECT rowid, collection_uid, uid, blob FROM items WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, chunksize)
+                ).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            for _, collection_uid, uid, blob in rows:
+                yield collection_uid, uid, blob
+
+    def get_items(self, uids: Iterable[str]) -> List[Tuple[str, str, bytes]]:
+        # (collection_uid, uid, blob) rows of the items among uids
+        uids = list(uids)
+        rows = []
+        with self.lock:
+            for i in range(0, len(uids), 500):
+                chunk = uids[i:i + 500]
+                rows += self.connection.execute(
+                    f"SELECT collection_uid, uid, blob FROM items WHERE uid IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+        return rows
+
+    def get_collection(self, uid: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.connection.execute("SELECT blob FROM collections WHERE uid = ?", (uid,)).fetchone()
+        return row[0] if row else None
+
+    def queue_items(self, collection_uid: str, items: Iterable[Tuple[str, bytes]], removed: Iterable[Tuple[str, bytes]] = ()):
+        # Journal local changes (and removals) of items for uploading. A queued item that changes again keeps
+        # its place in the queue with the new blob, the local state is written to the items table as well.
+        with self.lock, self.connection:
+            self._queue_items(collection_uid, items, removed)
+
+    def _queue_items(self, collection_uid: str, items: Iterable[Tuple[str, bytes]], removed: Iterable[Tuple[str, bytes]] = ()):
+        items = [(uid, collection_uid, blob, 0) for uid, blob in items]
+        removed = [(uid, collection_uid, blob, 1) for uid, blob in removed]
+        self.connection.executemany(
+            "INSERT INTO outbox (uid, collection_uid, blob, deleted) VALUES (?, ?, ?, ?) ON CONFLICT (uid) DO UPDATE SET "
+            "blob = excluded.blob, deleted = excluded.deleted, version = version + 1, attempts = 0",
+            items + removed
+        )
+        self.connection.executemany("INSERT OR REPLACE INTO items (uid, collection_uid, blob) VALUES (?, ?, ?)", [row[:3] for row in items])
+        self.connection.executemany("DELETE FROM items WHERE uid = ?", [row[:1] for row in removed])
+
+    def get_imports(self, source: str) -> Dict[str, str]:
+        # path -> uid of what was already imported from source
+        with self.lock:
+            return dict(self.connection.execute("SELECT path, uid FROM imports WHERE source = ?", (source,)).fetchall())
+
+    def record_imports(self, source: str, imports: Iterable[Tuple[str, str]]):
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO imports (source, path, uid) VALUES (?, ?, ?)", [(source, path, uid) for path, uid in imports])
+
+    def queue_imported_items(self, collection_uid: str, source: str, items: Iterable[Tuple[str, str, bytes]]):
+        # Queue new (path, uid, blob) items and record them as imported in one transaction,
+        # an interrupted import resumes without duplicating notes
+        items = list(items)
+        with self.lock, self.connection:
+            self._queue_items(collection_uid, [(uid, blob) for _, uid, blob in items])
+            self.connection.executemany("INSERT OR REPLACE INTO imports (source, path, uid) VALUES (?, ?, ?)", [(source, path, uid) for path, uid, _ in items])
+
+    def iter_outbox(self, max_attempts: int) -> List[Tuple[str, str, bytes, bool, int]]:
+        # (uid, collection_uid, blob, deleted, version) in the order the items were first queued
+        with self.lock:
+            return self.connection.execute(
+                "SELECT uid, collection_uid, blob, deleted, version FROM outbox WHERE attempts < ? ORDER BY seq",
+                (max_attempts,)
+            ).fetchall()
+
+    def complete_items(self, collection_uid: str, items: Iterable[Tuple[str, int, bytes, bool]]):
+        # Remove uploaded (uid, version, blob, deleted) items from the outbox and store what was uploaded,
+        # unless the item was queued again in the meantime
+        with self.lock, self.connection:
+            for uid, version, blob, deleted in items:
+                if not self.connection.execute("DELETE FROM outbox WHERE uid = ? AND version = ?", (uid, version)).rowcount:
+                    continue
+                if deleted:
+                    self.connection.execute("DELETE FROM items WHERE uid = ?", (uid,))
+                else:
+                    self.connection.execute("INSERT OR REPLACE INTO items (uid, collection_uid, blob) VALUES (?, ?, ?)", (uid, collection_uid, blob))
+
+    def resolve_conflict(self, collection_uid: str, uid: str, version: int, blob: Optional[bytes], copy: Optional[Tuple[str, bytes]]) -> bool:
+        # Replace a queued change that the server rejected with the server's revision (blob, None when it was removed),
+        # and queue copy, a new (uid, blob) item that keeps the local change. Unless the item was queued again meanwhile.
+        with self.lock, self.connection:
+            if not self.connection.execute("DELETE FROM outbox WHERE uid = ? AND version = ?", (uid, version)).rowcount:
+                return False
+            if blob is None:
+                self.connection.execute("DELETE FROM items WHERE uid = ?", (uid,))
+            else:
+                self.connection.execute("INSERT OR REPLACE INTO items (uid, collection_uid, blob) VALUES (?, ?, ?)", (uid, collection_uid, blob))
+            if copy is not None:
+                self._queue_items(collection_uid, [copy])
+        return True
+
+    def retry_items(self, uids: Iterable[str]):
+        with self.lock, self.connection:
+            self.connection.executemany("UPDATE outbox SET attempts = attempts + 1 WHERE uid = ?", [(uid,) for uid in uids])
+
+    def drop_items(self, uids: Iterable[str]):
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM outbox WHERE uid = ?", [(uid,) for uid in uids])
+
+    def queued_uids(self, uids: Iterable[str]) -> Set[str]:
+        # The uids among uids that are still waiting in the outbox
+        uids = list(uids)
+        queued = set()
+        with self.lock:
+            for i in range(0, len(uids), 500):
+                chunk = uids[i:i + 500]
+                rows = self.connection.execute(f"SELECT uid FROM outbox WHERE uid IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+                queued.update(row[0] for row in rows)
+        return queued
+
+    def count_stuck(self, max_attempts: int) -> int:
+        # Changes that are no longer uploaded, they failed max_attempts times while others went through
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM outbox WHERE attempts >= ?", (max_attempts,)).fetchone()[0]
+
+    def count_outbox(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def count_items(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def clear(self):
+        with self.lock, self.connection:
+            for table in ["state", "collections", "items", "outbox", "imports"]:
+                self.connection.execute(f"DELETE FROM {table}")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
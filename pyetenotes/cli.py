@@ -0,0 +1,208 @@
+import argparse
+import getpass
+import logging
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from .__version__ import __description__, __title__, __version__
+from .settings import FileSettings, use_settings
+
+
+logger = logging.getLogger("logger")
+
+
+# The CLI never imports Qt: the settings are kept in a JSON file instead of QSettings, and the modules that
+# need etebase are imported once the settings backend is selected.
+
+
+class CliError(Exception):
+    pass
+
+
+def config_path() -> str:
+    if sys.platform == "win32":
+        config_dir = os.environ.get("APPDATA", os.path.expanduser("~"))
+    else:
+        config_dir = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(config_dir, __title__, f"{__title__}-cli.json")
+
+
+def open_api():
+    from .etesync import EtesyncNotes
+    api = EtesyncNotes()
+    if not api.restore_stored_session():
+        raise CliError(f"Not logged in, run: python -m {__title__} login USERNAME")
+    return api
+
+
+def sync(api) -> Tuple[int, int, int]:
+    # Like TasksThread.update_notebooks: upload the outbox, then fetch the changes into the cache.
+    # Returns the number of uploaded changes, changed notes and removed notes.
+    from .fetch import FetchScheduler
+    uploaded = api.flush_outbox()
+    report_outbox(api)
+    notebooks, _ = api.get_notebook_changes()
+    changed, removed = 0, 0
+    for notes, removed_notes in FetchScheduler(api).iter_note_changes(notebooks):
+        changed += len(notes)
+        removed += len(removed_notes)
+    api.commit_notebook_changes()
+    api.cache_save()
+    return len(uploaded), changed, removed
+
+
+def report_outbox(api):
+    conflicts, dropped, stuck = api.take_outbox_report()
+    for note, copy in conflicts:
+        print(f"{note_path(note)} changed on the server, {f'the local changes were saved as {copy}' if copy else 'the removal was dropped'}.", file=sys.stderr)
+    if dropped:
+        print(f"{dropped} changes to removed notebooks were dropped.", file=sys.stderr)
+    if stuck:
+        print(f"{stuck} changes could not be uploaded, saving the notes again retries them.", file=sys.stderr)
+
+
+def load_notes(api, args) -> list:
+    # Notes of the cache, which is filled by a first sync
+    if args.sync or api.cache.count_items() == 0:
+        sync(api)
+    _, notes = api.cache_load()
+    notes = sorted(notes, key=lambda note: (note.notebook.name.casefold(), note.name.casefold()))
+    if getattr(args, "notebook", None):
+        notes = [note for note in notes if note.notebook.name == args.notebook or note.notebook.uid == args.notebook]
+    return notes
+
+
+def note_path(note) -> str:
+    return f"{note.notebook.name}/{note.name}"
+
+
+def find_note(notes: list, query: str):
+    # By uid, "notebook/name" or name
+    for match in [lambda note: note.uid == query, lambda note: note_path(note) == query, lambda note: note.name == query]:
+        found = [note for note in notes if match(note)]
+        if len(found) == 1:
+            return found[0]
+        if len(found) > 1:
+            raise CliError(f"{query} is ambiguous:\n" + "\n".join(f"  {note_path(note)}\t{note.uid}" for note in found))
+    raise CliError(f"No note {query}.")
+
+
+def command_login(args):
+    from .etesync import EtesyncNotes
+    password = os.environ.get("PYETENOTES_PASSWORD") or getpass.getpass(f"Password for {args.username}: ")
+    if not EtesyncNotes().authenticate(args.username, password, args.server):
+        raise CliError("Login failed.")
+    print(f"Logged in as {args.username}.")
+
+
+def command_logout(args):
+    open_api().logout()
+    print("Logged out.")
+
+
+def command_sync(args):
+    start = time.perf_counter()
+    uploaded, changed, removed = sync(open_api())
+    print(f"Uploaded {uploaded} changes, fetched {changed} changed and {removed} removed notes in {time.perf_counter() - start:.2f}s.")
+
+
+def command_list(args):
+    for note in load_notes(open_api(), args):
+        print(f"{note_path(note)}\t{note.uid}")
+
+
+def command_cat(args):
+    note = find_note(load_notes(open_api(), args), args.note)
+    sys.stdout.buffer.write(note.get_content(cache=False))
+    sys.stdout.flush()
+
+
+def command_search(args):
+    from .search import SearchIndex
+    notes = {note.uid: note for note in load_notes(open_api(), args)}
+    index = SearchIndex()
+    for note in notes.values():
+        index.update(note.uid, note.name, note.get_content(cache=False).decode(errors="replace"))
+    for uid, score in index.search(args.query)[:args.limit]:
+        print(f"{score:.2f}\t{note_path(notes[uid])}\t{uid}")
+
+
+def command_export(args):
+    from .export import NotesExporter
+    notes = load_notes(open_api(), args)
+    start = time.perf_counter()
+    count = NotesExporter(notes, args.destination, args.format, folders=args.folders).export()
+    print(f"Exported {count} notes to {args.destination} in {time.perf_counter() - start:.2f}s.")
+
+
+def command_import(args):
+    from .importer import NotesImporter
+    importer = NotesImporter(open_api(), args.source)
+    try:
+        imported, skipped, queued = importer.run()
+    finally:
+        importer.close()
+    print(f"Imported {imported} notes, {skipped} skipped (imported before), {queued} still queued for uploading.")
+
+
+def parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=f"python -m {__title__}", description=__description__)
+    parser.add_argument("--version", action="version", version=f"{__title__} {__version__}")
+    parser.add_argument("--config", default=config_path(), help="settings file (default: %(default)s)")
+    parser.add_argument("--sync", action="store_true", help="sync before reading the notes")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    login = commands.add_parser("login", help="log in and store the session (password from PYETENOTES_PASSWORD or a prompt)")
+    login.add_argument("username")
+    login.add_argument("--server", default=None, help="server url, the EteSync server by default")
+    login.set_defaults(function=command_login)
+
+    commands.add_parser("logout", help="log out and clear the cache").set_defaults(function=command_logout)
+    commands.add_parser("sync", help="upload local changes and fetch remote ones").set_defaults(function=command_sync)
+
+    list_notes = commands.add_parser("list", help="list notes as notebook/name and uid")
+    list_notes.add_argument("--notebook", help="notebook name or uid")
+    list_notes.set_defaults(function=command_list)
+
+    cat = commands.add_parser("cat", help="print the contents of a note")
+    cat.add_argument("note", help="uid, notebook/name or name")
+    cat.set_defaults(function=command_cat)
+
+    search = commands.add_parser("search", help="search note names and contents")
+    search.add_argument("query")
+    search.add_argument("--notebook", help="notebook name or uid")
+    search.add_argument("--limit", type=int, default=20)
+    search.set_defaults(function=command_search)
+
+    export = commands.add_parser("export", help="export notes to a directory, .zip, .tar, .tar.gz or .jsonl file")
+    export.add_argument("destination")
+    export.add_argument("--notebook", help="notebook name or uid")
+    export.add_argument("--format", choices=["txt", "md", "html"], default=None, help="html needs PyQt5")
+    export.add_argument("--folders", action="store_true", default=None, help="one folder per notebook")
+    export.set_defaults(function=command_export)
+
+    import_notes = commands.add_parser("import", help="import the markdown and text files of a directory or a zip archive")
+    import_notes.add_argument("source")
+    import_notes.set_defaults(function=command_import)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parser().parse_args(argv)
+    logging.basicConfig(stream=sys.stderr, format="%(levelname)s: %(message)s", level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    file_settings = FileSettings(args.config)
+    use_settings(lambda name: file_settings)
+
+    try:
+        args.function(args)
+    except CliError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    return 0
@@ -1,17 +1,32 @@
 import logging
-import pickle
+import threading
 import time
-from typing import Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
 from etebase import (DEFAULT_SERVER_URL, Account, Client, Collection,
                      FetchOptions, random_bytes)
 
 from .__version__ import __title__
-from .settings import Settings
+from .cache import NotesCache
+from .settings import get_settings
+from .utils import LRUCache
 
 
 logger = logging.getLogger("logger")
-settings = Settings(__title__)
+settings = get_settings(__title__)
+
+# Items uploaded one by one after a failed batch before concluding the server is unreachable
+UPLOAD_PROBES = 3
+
+# Decrypted note contents, keyed by (uid, etag)
+note_contents = LRUCache(settings.value("etesync/contentcache/size", type=int))
+
+
+def is_conflict(error: Exception) -> bool:
+    # etebase raises the server's message, an upload on top of an outdated revision is rejected as a conflict (409)
+    message = str(error).lower()
+    return "conflict" in message or "wrong etag" in message
 
 
 class Notebook(object):
@@ -26,19 +41,57 @@ class Note(object):
     def __init__(self, item: Any, notebook: Notebook):
         self.uid = item.uid
         self.name = item.meta["name"]
-        self.content = item.content
         self.changed = False
         self.item = item
         self.notebook = notebook
+        self._content = None  # Local contents, not yet written to the item
+        self.uploading = None  # Contents of a running upload
+
+    @property
+    def content(self) -> bytes:
+        return self.get_content()
+
+    def get_content(self, cache: bool = True) -> bytes:
+        # Decrypt the contents on first access, only the most recently used ones stay in memory.
+        # Bulk readers (indexing, exporting) pass cache=False to not evict the notes that are in use.
+        if self._content is not None:
+            return self._content
+        key = (self.uid, self.item.etag)
+        if (content := note_contents.get(key)) is None:
+            content = self.item.content
+            if cache:
+                note_contents.put(key, content)
+        return content
+
+    @content.setter
+    def content(self, content: bytes):
+        self._content = content
+
+    def mark_uploaded(self):
+        # Contents that were changed again during the upload stay pending
+        if self._content is None or self._content is self.uploading:
+            self.changed = False
+            self._content = None  # The item holds the uploaded contents now
+        if self.uploading is not None:
+            # Setting the contents made a new revision of the item, its etag, keep the decrypted contents of that revision
+            note_contents.put((self.uid, self.item.etag), self.uploading)
+        self.uploading = None
 
 
 class EtesyncNotes(object):
-    def __init__(self):
+    def __init__(self, cache_path: str = None):
         self.server_url = None
         self.client = None
         self.etebase = None
         self.authenticated = False
-        self.stoken = {"notebook": None, "note": None}
+        # "notes" holds one sync token per collection uid
+        self.stoken = {"notebook": None, "notes": {}}
+        # Notebook sync token of the last listing, committed once the items of the listed notebooks were fetched
+        self.pending_stoken = None
+        self.cache = NotesCache(cache_path or settings.value("cache/path", type=str))
+        self.outbox_lock = threading.Lock()  # one flush at a time
+        self.conflicts: List[Tuple[Note, Optional[str]]] = []  # see take_outbox_report
+        self.dropped = 0
 
     def authenticate(self, username: str, password: str, server_url: str = None, stay_logged_in: bool = True) -> bool:
         self.server_url = server_url or DEFAULT_SERVER_URL
@@ -69,56 +122,55 @@ class EtesyncNotes(object):
         self.client = Client(__title__, self.server_url)
         self.etebase = Account.restore(self.client, stored_session, encryption_key)
 
-    def cache_save(self, notebooks: List[Notebook], notes: List[Note]):
-        cache = {"stoken": self.stoken, "notebooks": [], "notes": []}
-
-        col_mgr = self.etebase.get_collection_manager()
-        for notebook in notebooks:
-            cache["notebooks"].append(col_mgr.cache_save(notebook.collection))
-
-        for note in notes:
-            item_mgr = col_mgr.get_item_manager(note.notebook.collection)
-            cache["notes"].append((note.notebook.uid, item_mgr.cache_save(note.item)))
+    def restore_stored_session(self) -> bool:
+        # Restore the session stored by authenticate(stay_logged_in=True), if any
+        encryption_key = settings.value("session/key", type=bytes)
+        stored_session = settings.value("session/sessiondata", type=str)
+        server_url = settings.value("session/url", type=str)
+        if not (encryption_key and stored_session and server_url):
+            return False
+        self.restore_session(encryption_key, stored_session, server_url)
+        self.authenticated = True
+        return True
 
-        with open(settings.value("cache/path"), "wb") as f:
-            pickle.dump(cache, f)
+    def cache_save(self):
+        # Collections and items are written to the cache as they are fetched or uploaded, only the notebook token remains
+        self.cache.set_state("stoken", self.stoken["notebook"])
 
-    def cache_load(self):
-        try:
-            with open(settings.value("cache/path", type=str), "rb") as f:
-                cache = pickle.load(f)
-        except FileNotFoundError as e:
-            logger.debug(f"EtesyncNotes.cache_load: file not found: {e}")
-            return [], []
-        except pickle.PickleError as e:
-            logger.error(f"EtesyncNotes.cache_load: pickle error: {e}")
-            return [], []
-
-        # Retrieve notebooks
+    def cache_load(self) -> Tuple[List[Notebook], Iterator[Note]]:
+        # The notes are loaded lazily, while the returned iterator is consumed
         col_mgr = self.etebase.get_collection_manager()
+        notebooks = {}
         try:
-            notebooks = [Notebook(col_mgr.cache_load(blob)) for blob in cache["notebooks"]]
+            for uid, blob, stoken in self.cache.iter_collections():
+                notebooks[uid] = Notebook(col_mgr.cache_load(blob))
+                if stoken is not None:
+                    self.stoken["notes"][uid] = stoken
         except Exception as e:
             logger.warning(f"EtesyncNotes.cache_load: cache_load error: {e}")
-            return [], []
+            self.stoken["notes"].clear()
+            return [], iter(())
 
         if not notebooks:
-            return [], []
+            return [], iter(())
 
-        self.stoken = cache["stoken"]
+        self.stoken["notebook"] = self.cache.get_state("stoken")
 
-        # Retrieve notes
-        notes = []
-        for notebook_uid, blob in cache["notes"]:
-            notebook = list(filter(lambda nb: notebook_uid == nb.uid, notebooks))
-            if not notebook:
-                return
-            notebook = notebook[0]
-            item_mgr = col_mgr.get_item_manager(notebook.collection)
-            item = item_mgr.cache_load(blob)
-            notes.append(Note(item, notebook))
+        return list(notebooks.values()), self._iter_cached_notes(notebooks)
 
-        return notebooks, notes
+    def _iter_cached_notes(self, notebooks: Dict[str, Notebook]) -> Iterator[Note]:
+        col_mgr = self.etebase.get_collection_manager()
+        item_mgrs = {}
+        for notebook_uid, uid, blob in self.cache.iter_items():
+            if (notebook := notebooks.get(notebook_uid)) is None:
+                logger.warning(f"EtesyncNotes.cache_load: notebook {notebook_uid} of note {uid} not found.")
+                continue
+            if (item_mgr := item_mgrs.get(notebook_uid)) is None:
+                item_mgr = item_mgrs[notebook_uid] = col_mgr.get_item_manager(notebook.collection)
+            yield Note(item_mgr.cache_load(blob), notebook)
+
+    def _cache_notes(self, item_mgr: Any, notebook_uid: str, items: List[Any], removed: List[str] = (), stoken: str = None):
+        self.cache.save_items(notebook_uid, [(item.uid, item_mgr.cache_save(item)) for item in items], removed, stoken)
 
     def logout(self):
         self.etebase.logout()
@@ -127,12 +179,57 @@ class EtesyncNotes(object):
         settings.remove("notetreewidget/")
         settings.remove("noteentrywidget/")
         settings.remove("newnotedialog/selectednotebook")
+        self.cache.clear()
 
-    def get_notebooks(self, changes=False) -> List[Notebook]:
+    def _list_collections(self, changes: bool) -> Iterator[List[Collection]]:
+        # Page through the collections. The new notebook sync token stays pending until commit_notebook_changes,
+        # so a sync that fails before the notes of the listed notebooks were fetched lists them again.
         col_mgr = self.etebase.get_collection_manager()
-        collections = col_mgr.list("etebase.md.note", FetchOptions().stoken(self.stoken["notebook"] if changes else None))
-        self.stoken["notebook"] = collections.stoken
-        return [Notebook(collection) for collection in collections.data if not collection.deleted]
+        stoken = self.stoken["notebook"] if changes else None
+        done = False
+        while not done:
+            collections = col_mgr.list("etebase.md.note", FetchOptions().stoken(stoken).limit(settings.value("etesync/pagesize", type=int)))
+            stoken = self.pending_stoken = collections.stoken
+            done = collections.done
+            self.cache.save_collections(
+                [(collection.uid, col_mgr.cache_save(collection)) for collection in collections.data if not collection.deleted],
+                [collection.uid for collection in collections.data if collection.deleted]
+            )
+            yield list(collections.data)
+
+    def commit_notebook_changes(self):
+        # Call once the note changes of every notebook returned by the last listing were fetched
+        if self.pending_stoken is not None:
+            self.stoken["notebook"] = self.pending_stoken
+            self.pending_stoken = None
+
+    def iter_notebooks(self, changes=False) -> Iterator[Notebook]:
+        for collections in self._list_collections(changes):
+            for collection in collections:
+                if not collection.deleted:
+                    yield Notebook(collection)
+
+    def get_notebooks(self, changes=False) -> List[Notebook]:
+        return list(self.iter_notebooks(changes))
+
+    def iter_notebook_changes(self) -> Iterator[Tuple[List[Notebook], List[str]]]:
+        # Per page: notebooks that were created or changed since the last sync, and the uids of deleted notebooks
+        for collections in self._list_collections(changes=True):
+            changed, deleted = [], []
+            for collection in collections:
+                if collection.deleted:
+                    deleted.append(collection.uid)
+                    self.stoken["notes"].pop(collection.uid, None)
+                else:
+                    changed.append(Notebook(collection))
+            yield changed, deleted
+
+    def get_notebook_changes(self) -> Tuple[List[Notebook], List[str]]:
+        changed, deleted = [], []
+        for changed_page, deleted_page in self.iter_notebook_changes():
+            changed += changed_page
+            deleted += deleted_page
+        return changed, deleted
 
     def create_notebook(self, name: str, description: str, color: str) -> Notebook:
         col_mgr = self.etebase.get_collection_manager()
@@ -147,34 +244,236 @@ class EtesyncNotes(object):
             b""  # Empty content
         )
         col_mgr.upload(collection)
+        self.cache.save_collections([(collection.uid, col_mgr.cache_save(collection))])
         return Notebook(collection)
 
     def remove_notebook(self, notebook: Notebook):
         col_mgr = self.etebase.get_collection_manager()
         notebook.collection.delete()
         col_mgr.upload(notebook.collection)
+        self.cache.save_collections([], [notebook.uid])
+        self.stoken["notes"].pop(notebook.uid, None)
 
-    def get_notes(self, notebook: Notebook, changes=False) -> List[Note]:
+    def _list_items(self, notebook: Notebook, changes: bool) -> Iterator[List[Any]]:
+        # Page through the items of notebook, advancing its sync token after every page
         col_mgr = self.etebase.get_collection_manager()
         item_mgr = col_mgr.get_item_manager(notebook.collection)
-        items = item_mgr.list(FetchOptions().stoken(self.stoken["note"] if changes else None))
-        self.stoken["note"] = items.stoken
-        return [Note(item, notebook) for item in items.data if not item.deleted]
+        stoken = self.stoken["notes"].get(notebook.uid) if changes else None
+        done = False
+        while not done:
+            items = item_mgr.list(FetchOptions().stoken(stoken).limit(settings.value("etesync/pagesize", type=int)))
+            stoken = self.stoken["notes"][notebook.uid] = items.stoken
+            done = items.done
+            self._cache_notes(
+                item_mgr,
+                notebook.uid,
+                [item for item in items.data if not item.deleted],
+                [item.uid for item in items.data if item.deleted],
+                stoken
+            )
+            yield list(items.data)
+
+    def iter_notes(self, notebook: Notebook, changes=False) -> Iterator[Note]:
+        for items in self._list_items(notebook, changes):
+            for item in items:
+                if not item.deleted:
+                    yield Note(item, notebook)
 
-    def save_notes(self, notes: List[Note], force: bool = False):
+    def get_notes(self, notebook: Notebook, changes=False) -> List[Note]:
+        return list(self.iter_notes(notebook, changes))
+
+    def iter_note_changes(self, notebook: Notebook) -> Iterator[Tuple[List[Note], List[str]]]:
+        # Per page: notes in notebook that were created or changed since the last sync, and the uids of deleted notes
+        for items in self._list_items(notebook, changes=True):
+            changed, deleted = [], []
+            for item in items:
+                if item.deleted:
+                    deleted.append(item.uid)
+                else:
+                    changed.append(Note(item, notebook))
+            yield changed, deleted
+
+    def get_note_changes(self, notebook: Notebook) -> Tuple[List[Note], List[str]]:
+        changed, deleted = [], []
+        for changed_page, deleted_page in self.iter_note_changes(notebook):
+            changed += changed_page
+            deleted += deleted_page
+        return changed, deleted
+
+    def save_notes(self, notes: List[Note], force: bool = False) -> Tuple[List[Note], List[Note]]:
+        # Journal the new contents in the outbox and try to upload them. Returns the uploaded notes and the notes
+        # that stay queued, those are uploaded by a later flush_outbox.
+        self._refresh_items(notes)
+        notebooks = {}
         for note in notes:
-            self.save_note(note, force=force)
+            if not note.changed and not force:
+                logger.debug(f"EtesyncNotes.save_notes: {note.name} has no new contents. Skipping.")
+                continue
+            note.uploading = note.content
+            note.item.content = note.uploading
+            notebooks.setdefault(note.notebook.uid, []).append(note)
+
+        col_mgr = self.etebase.get_collection_manager()
+        for notebook_notes in notebooks.values():
+            item_mgr = col_mgr.get_item_manager(notebook_notes[0].notebook.collection)
+            self._queue_notes(item_mgr, notebook_notes[0].notebook.uid, [note.item for note in notebook_notes])
+            for note in notebook_notes:
+                note.mark_uploaded()
+
+        # Another flush (the sync thread's) may have uploaded the notes first, what is left in the outbox is queued
+        self.flush_outbox()
+        pending = self.cache.queued_uids(note.uid for notebook_notes in notebooks.values() for note in notebook_notes)
+        saved, queued = [], []
+        for notebook_notes in notebooks.values():
+            for note in notebook_notes:
+                (queued if note.uid in pending else saved).append(note)
+        self._refresh_items(saved)
+
+        logger.debug(f"EtesyncNotes.save_notes: {len(saved)} uploaded, {len(queued)} queued in {len(notebooks)} notebooks.")
+        return saved, queued
 
     def save_note(self, note: Note, force: bool = False):
-        if not note.changed and not force:
-            logger.debug(f"EtesyncNotes.save_note: {note.name} has no new contents. Skipping.")
+        self.save_notes([note], force)
+
+    def _refresh_items(self, notes: List[Note]):
+        # flush_outbox uploads copies of the items that it loads from the outbox, an upload marks only that copy as saved.
+        # The cached item of the same revision carries the etag the server has now, the note's own item still has the
+        # previous one and its next upload would be rejected as a conflict.
+        notes = {note.uid: note for note in notes}
+        if not notes:
             return
-        note.item.content = note.content
         col_mgr = self.etebase.get_collection_manager()
-        item_mgr = col_mgr.get_item_manager(note.notebook.collection)
-        item_mgr.batch([note.item])
-        note.changed = False
-        logger.debug(f"EtesyncNotes.save_note: {note.name} saved.")
+        item_mgrs = {}
+        for notebook_uid, uid, blob in self.cache.get_items(notes):
+            note = notes[uid]
+            if (item_mgr := item_mgrs.get(notebook_uid)) is None:
+                item_mgr = item_mgrs[notebook_uid] = col_mgr.get_item_manager(note.notebook.collection)
+            if (item := item_mgr.cache_load(blob)).etag == note.item.etag:
+                note.item = item
+
+    def _queue_notes(self, item_mgr: Any, notebook_uid: str, items: List[Any], removed: List[Any] = ()):
+        self.cache.queue_items(
+            notebook_uid,
+            [(item.uid, item_mgr.cache_save(item)) for item in items],
+            [(item.uid, item_mgr.cache_save(item)) for item in removed]
+        )
+
+    def flush_outbox(self) -> Set[str]:
+        # Upload the journaled changes in batches of etesync/upload/chunksize items per notebook, up to
+        # etesync/upload/concurrency batches at once. Returns the uids of the uploaded items. Stops once a batch
+        # fails as a whole (likely offline), items that fail on their own while others go through are retried
+        # up to etesync/outbox/maxattempts times. Rejected changes (conflicts) are kept as copies, uploaded right after.
+        with self.outbox_lock:
+            uploaded, copies = self._flush_outbox()
+            if copies:
+                uploaded |= self._flush_outbox(copies)[0]
+        logger.debug(f"EtesyncNotes.flush_outbox: {len(uploaded)} changes uploaded.")
+        return uploaded
+
+    def _flush_outbox(self, uids: Set[str] = None) -> Tuple[Set[str], Set[str]]:
+        # Uploads the outbox, or the items among uids. Returns the uids of the uploaded items and of the queued copies.
+        uploaded, failed_uids, copies = set(), [], set()
+        rows = self.cache.iter_outbox(settings.value("etesync/outbox/maxattempts", type=int))
+        if uids is not None:
+            rows = [row for row in rows if row[0] in uids]
+        if not rows:
+            return uploaded, copies
+
+        notebooks: Dict[str, List] = {}
+        for row in rows:
+            notebooks.setdefault(row[1], []).append(row)
+
+        chunksize = max(1, settings.value("etesync/upload/chunksize", type=int))
+        chunks = []
+        for notebook_uid, notebook_rows in notebooks.items():
+            if (collection_blob := self.cache.get_collection(notebook_uid)) is None:
+                logger.warning(f"EtesyncNotes.flush_outbox: notebook {notebook_uid} no longer exists, dropping {len(notebook_rows)} changes.")
+                self.cache.drop_items([row[0] for row in notebook_rows])
+                self.dropped += len(notebook_rows)
+                continue
+            for i in range(0, len(notebook_rows), chunksize):
+                chunks.append((notebook_uid, collection_blob, {row[0]: row for row in notebook_rows[i:i + chunksize]}))
+
+        col_mgr = self.etebase.get_collection_manager()
+        offline = threading.Event()
+
+        def upload(notebook_uid: str, collection_blob: bytes, chunk: Dict[str, Tuple]) -> Tuple[List[Any], List[Any], List[str]]:
+            if offline.is_set():
+                return [], [], []
+            notebook = Notebook(col_mgr.cache_load(collection_blob))
+            item_mgr = col_mgr.get_item_manager(notebook.collection)
+            saved, failed, conflicted = self._upload_items(item_mgr, [item_mgr.cache_load(row[2]) for row in chunk.values()])
+            self.cache.complete_items(notebook_uid, [(item.uid, chunk[item.uid][4], item_mgr.cache_save(item), chunk[item.uid][3]) for item in saved])
+            copies = self._resolve_conflicts(item_mgr, notebook, conflicted, chunk) if conflicted else []
+            if failed and not saved and not conflicted:
+                offline.set()
+            return saved, failed, copies
+
+        if chunks:
+            concurrency = max(1, settings.value("etesync/upload/concurrency", type=int))
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks)), thread_name_prefix="upload") as executor:
+                for saved, failed, chunk_copies in executor.map(lambda chunk: upload(*chunk), chunks):
+                    uploaded.update(item.uid for item in saved)
+                    failed_uids += [item.uid for item in failed]
+                    copies.update(chunk_copies)
+
+        if offline.is_set():
+            logger.warning(f"EtesyncNotes.flush_outbox: upload failed, {self.cache.count_outbox()} changes stay queued.")
+        if uploaded or copies:
+            # Only count attempts while the server is reachable
+            self.cache.retry_items(failed_uids)
+        return uploaded, copies
+
+    def _upload_items(self, item_mgr: Any, items: List[Any]) -> Tuple[List[Any], List[Any], List[Any]]:
+        # Returns the saved, failed and conflicting (rejected by the server) items
+        try:
+            item_mgr.batch(items)
+        except Exception as e:
+            logger.warning(f"EtesyncNotes._upload_items: batch of {len(items)} failed: {e}")
+            if len(items) == 1:
+                return ([], [], items) if is_conflict(e) else ([], items, [])
+            # A batch is rejected as a whole, upload the items one by one to find the failing ones.
+            # Give up when the first few fail as well (likely offline), the remaining items are neither saved nor failed.
+            saved, failed, conflicted = [], [], []
+            for item in items:
+                if not saved and not conflicted and len(failed) >= UPLOAD_PROBES:
+                    break
+                item_saved, item_failed, item_conflicted = self._upload_items(item_mgr, [item])
+                saved += item_saved
+                failed += item_failed
+                conflicted += item_conflicted
+            return saved, failed, conflicted
+        return items, [], []
+
+    def _resolve_conflicts(self, item_mgr: Any, notebook: Notebook, items: List[Any], chunk: Dict[str, Tuple]) -> List[str]:
+        # The server has a newer revision of these items, it replaces the queued change. A changed note is kept as a
+        # copy next to it, a removal is dropped. Returns the uids of the queued copies.
+        copies = []
+        for item in items:
+            try:
+                remote = item_mgr.fetch(item.uid)
+            except Exception as e:
+                logger.warning(f"EtesyncNotes._resolve_conflicts: fetching {item.uid} failed, the change stays queued: {e}")
+                continue
+            copy = None
+            if not item.deleted:
+                name = f"{item.meta['name']} (conflict {time.strftime('%Y-%m-%d %H:%M')})"
+                copy = item_mgr.create(dict(item.meta, name=name, mtime=int(round(time.time() * 1000))), item.content)
+            blob = None if remote.deleted else item_mgr.cache_save(remote)
+            if self.cache.resolve_conflict(notebook.uid, item.uid, chunk[item.uid][4], blob, None if copy is None else (copy.uid, item_mgr.cache_save(copy))):
+                logger.warning(f"EtesyncNotes._resolve_conflicts: {item.uid} changed on the server, {'kept as ' + copy.meta['name'] if copy else 'removal dropped'}.")
+                self.conflicts.append((Note(remote, notebook), None if copy is None else copy.meta["name"]))
+                if copy is not None:
+                    copies.append(copy.uid)
+        return copies
+
+    def take_outbox_report(self) -> Tuple[List[Tuple[Note, Optional[str]]], int, int]:
+        # What the flushes since the last report could not upload as it was: the conflicts as (the server's revision,
+        # name of the copy of the local change or None), the number of dropped changes, and the number of stuck changes
+        with self.outbox_lock:
+            conflicts, self.conflicts = self.conflicts, []
+            dropped, self.dropped = self.dropped, 0
+        return conflicts, dropped, self.cache.count_stuck(settings.value("etesync/outbox/maxattempts", type=int))
 
     def create_note(self, name: str, notebook: Notebook) -> Note:
         col_mgr = self.etebase.get_collection_manager()
@@ -188,12 +487,55 @@ class EtesyncNotes(object):
             },
             b""
         )
-        item_mgr.batch([item])
-
-        return Note(item, notebook)
+        # Created locally, uploaded now or by a later flush
+        self._queue_notes(item_mgr, notebook.uid, [item])
+        self.flush_outbox()
+
+        note = Note(item, notebook)
+        self._refresh_items([note])
+        return note
+
+    def get_cached_notebook(self, uid: str) -> Optional[Notebook]:
+        if (collection_blob := self.cache.get_collection(uid)) is None:
+            return None
+        return Notebook(self.etebase.get_collection_manager().cache_load(collection_blob))
+
+    def get_cached_notes(self, uids: List[str], notebooks: Dict[str, Notebook] = None) -> List[Note]:
+        # Notes by uid from the cache, in the order of uids. Notebooks that are not passed are loaded from the cache as well.
+        notebooks = dict(notebooks or {})
+        col_mgr = self.etebase.get_collection_manager()
+        item_mgrs, notes = {}, {}
+        for notebook_uid, uid, blob in self.cache.get_items(uids):
+            if notebook_uid not in notebooks:
+                notebooks[notebook_uid] = self.get_cached_notebook(notebook_uid)
+            if (notebook := notebooks[notebook_uid]) is None:
+                logger.warning(f"EtesyncNotes.get_cached_notes: notebook {notebook_uid} of note {uid} not found.")
+                continue
+            if (item_mgr := item_mgrs.get(notebook_uid)) is None:
+                item_mgr = item_mgrs[notebook_uid] = col_mgr.get_item_manager(notebook.collection)
+            notes[uid] = Note(item_mgr.cache_load(blob), notebook)
+        return [notes[uid] for uid in uids if uid in notes]
+
+    def get_cached_note(self, uid: str, notebook: Notebook = None) -> Optional[Note]:
+        notes = self.get_cached_notes([uid], {notebook.uid: notebook} if notebook is not None else None)
+        return notes[0] if notes else None
+
+    def queue_imported_notes(self, notebook: Notebook, source: str, entries: List[Tuple[str, str, int, bytes]]) -> List[str]:
+        # Create items for (path, name, mtime, content) entries of source and journal them in the outbox,
+        # they are uploaded by the next flush_outbox. Returns the uids of the new items.
+        col_mgr = self.etebase.get_collection_manager()
+        item_mgr = col_mgr.get_item_manager(notebook.collection)
+        items = [
+            (path, item_mgr.create({"type": "file", "name": name, "mtime": mtime}, content))
+            for path, name, mtime, content in entries
+        ]
+        self.cache.queue_imported_items(notebook.uid, source, [(path, item.uid, item_mgr.cache_save(item)) for path, item in items])
+        return [item.uid for _, item in items]
 
     def remove_note(self, note: Note):
+        self._refresh_items([note])
         col_mgr = self.etebase.get_collection_manager()
         item_mgr = col_mgr.get_item_manager(note.notebook.collection)
         note.item.delete()
-        item_mgr.batch([note.item])
+        self._queue_notes(item_mgr, note.notebook.uid, [], [note.item])
+        self.flush_outbox()
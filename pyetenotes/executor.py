@@ -0,0 +1,145 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Hashable, Iterable, List
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import pyqtSignal
+
+from .__version__ import __title__
+from .settings import get_settings
+from .utils import LatencyStats
+
+
+logger = logging.getLogger("logger")
+settings = get_settings(__title__)
+
+
+class Priority(object):
+    High = 0
+    Normal = 1
+    Low = 2
+
+
+class ScheduledTask(object):
+    __slots__ = ("task", "priority", "seq", "keys", "future", "blocked", "submitted")
+
+    def __init__(self, task: QtCore.QObject, priority: int, seq: int, keys: List[Hashable]):
+        self.task = task
+        self.priority = priority
+        self.seq = seq
+        self.keys = keys
+        self.future = Future()
+        self.blocked = 0  # number of keys for which an earlier task is still queued or running
+        self.submitted = time.perf_counter()
+
+    def __lt__(self, other: "ScheduledTask") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class TaskExecutor(QtCore.QObject):
+    # Runs tasks on a fixed pool of threads, by priority and then in submission order.
+    # Tasks sharing a key (e.g. a note uid) run one after another in the order they were submitted.
+    released = pyqtSignal(object)
+
+    def __init__(self, workers: int = None):
+        super(TaskExecutor, self).__init__()
+        self.condition = threading.Condition()
+        self.ready: List[ScheduledTask] = []  # heap
+        self.keyed: Dict[Hashable, deque] = {}  # key -> its queued and running tasks, the first one is running or ready
+        self.seq = itertools.count()
+        self.running = True
+        self.tasks = set()  # references until the task's signals were delivered
+        self.stats: Dict[str, Dict[str, LatencyStats]] = {}
+        self.released.connect(self.release)
+
+        workers = max(1, workers or settings.value("tasks/workers", type=int))
+        self.threads = [threading.Thread(target=self.work, name=f"task-{i}", daemon=True) for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, task: QtCore.QObject, priority: int = None, keys: Iterable[Hashable] = None) -> Future:
+        # Defaults to the task's own priority and keys
+        priority = task.priority if priority is None else priority
+        keys = task.keys() if keys is None else keys
+        with self.condition:
+            if not self.running:
+                raise RuntimeError("TaskExecutor.submit: executor is shut down.")
+            scheduled = ScheduledTask(task, priority, next(self.seq), list(dict.fromkeys(keys)))
+            for key in scheduled.keys:
+                queue = self.keyed.setdefault(key, deque())
+                if queue:
+                    scheduled.blocked += 1
+                queue.append(scheduled)
+            if not scheduled.blocked:
+                heapq.heappush(self.ready, scheduled)
+                self.condition.notify()
+            self.tasks.add(task)
+        return scheduled.future
+
+    def shutdown(self, wait: bool = True):
+        # Queued tasks are still run
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+    def cancel_tasks(self):
+        # Ask the queued and running tasks that can stop early to do so
+        with self.condition:
+            tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+
+    def task_stats(self, name: str) -> Dict[str, Dict[str, float]]:
+        # Time spent queued and running, of the most recent tasks of class name
+        stats = self.stats.get(name, {})
+        return {kind: stat.summary() for kind, stat in stats.items()}
+
+    def release(self, task: QtCore.QObject):
+        self.tasks.discard(task)
+
+    def work(self):
+        while True:
+            with self.condition:
+                while not self.ready and (self.running or self.keyed):
+                    self.condition.wait()
+                if not self.ready:
+                    self.condition.notify_all()
+                    return
+                scheduled = heapq.heappop(self.ready)
+
+            started = time.perf_counter()
+            if scheduled.future.set_running_or_notify_cancel():
+                try:
+                    scheduled.future.set_result(scheduled.task.run())
+                except Exception as e:
+                    logger.error(f"TaskExecutor.work: {scheduled.task.__class__.__name__} raised: {e}")
+                    scheduled.future.set_exception(e)
+            finished = time.perf_counter()
+
+            stats = self.stats.setdefault(scheduled.task.__class__.__name__, {"queued": LatencyStats(), "run": LatencyStats()})
+            stats["queued"].add(started - scheduled.submitted)
+            stats["run"].add(finished - started)
+
+            with self.condition:
+                for key in scheduled.keys:
+                    queue = self.keyed[key]
+                    queue.popleft()
+                    if queue:
+                        successor = queue[0]
+                        successor.blocked -= 1
+                        if not successor.blocked:
+                            heapq.heappush(self.ready, successor)
+                    else:
+                        del self.keyed[key]
+                self.condition.notify_all()
+
+            # Drop the reference on the GUI thread, after the task's queued signals
+            self.released.emit(scheduled.task)
@@ -0,0 +1,191 @@
+import io
+import json
+import logging
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from .__version__ import __title__
+from .etesync import Note
+from .settings import get_settings
+from .utils import get_clean_string
+
+
+logger = logging.getLogger("logger")
+settings = get_settings(__title__)
+
+
+FORMATS = ["txt", "md", "html"]
+ARCHIVE_EXTENSIONS = [".zip", ".tar", ".tar.gz", ".tgz"]
+JSONL_EXTENSION = ".jsonl"
+
+
+def unique_names(entries: Iterable[Tuple[str, str]], extension: str, taken: Iterable[str] = ()) -> List[str]:
+    # Relative paths "folder/name.extension" for (folder, name) entries, numbered "name (1).extension" on collisions.
+    # Computed in memory: taken holds the paths that already exist, compared case insensitively.
+    used = {path.casefold() for path in taken}
+    counters = {}
+    paths = []
+    for folder, name in entries:
+        name = get_clean_string(name).strip() or "Untitled"
+        base = f"{folder}/{name}" if folder else name
+        key = base.casefold()
+        i = counters.get(key, 0)
+        while True:
+            path = f"{base}.{extension}" if i == 0 else f"{base} ({i}).{extension}"
+            i += 1
+            if path.casefold() not in used:
+                break
+        counters[key] = i
+        used.add(path.casefold())
+        paths.append(path)
+    return paths
+
+
+def export_format(path: str) -> str:
+    # The format of a single exported note, by its file extension
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    return extension if extension in FORMATS else "txt"
+
+
+def render(note: Note, format: str) -> bytes:
+    # Contents are decrypted without filling the content cache, exports touch every note once
+    content = note.get_content(cache=False)
+    if format != "html":
+        return content
+    from PyQt5 import QtGui
+    document = QtGui.QTextDocument()
+    document.setMetaInformation(QtGui.QTextDocument.DocumentTitle, note.name)
+    document.setMarkdown(content.decode(errors="replace"))
+    return document.toHtml().encode()
+
+
+class NotesExporter(object):
+    # Exports notes to a directory, a zip or tar archive (by the destination's extension) or a JSON lines file.
+    # Notes are decrypted and rendered on a pool of threads, archives are written in the order of notes.
+    def __init__(self, notes: List[Note], destination: str, format: str = None, extension: str = None, folders: bool = None,
+                 workers: int = None, progress: Callable[[int, int], None] = None, cancelled: threading.Event = None):
+        self.notes = notes
+        self.destination = destination
+        self.format = format or settings.value("export/format", type=str)
+        # The txt format keeps the configured extension
+        self.extension = extension or (settings.value("export/extension", type=str) if self.format == "txt" else self.format)
+        self.folders = settings.value("export/folders", type=bool) if folders is None else folders  # one folder per notebook
+        self.workers = max(1, workers or settings.value("export/workers", type=int))
+        self.progress = progress
+        self.cancelled = cancelled or threading.Event()
+        self.done = 0
+        self.last_progress = 0.0
+
+    def archive_extension(self) -> Optional[str]:
+        lower = self.destination.lower()
+        for extension in sorted(ARCHIVE_EXTENSIONS + [JSONL_EXTENSION], key=len, reverse=True):
+            if lower.endswith(extension):
+                return extension
+        return None
+
+    def export(self) -> int:
+        start = time.perf_counter()
+        if (extension := self.archive_extension()) == JSONL_EXTENSION:
+            self.export_jsonl()
+        elif extension is not None:
+            self.export_archive(extension)
+        else:
+            self.export_directory()
+        if self.cancelled.is_set():
+            # An incomplete archive would pass for a backup, the files written to a directory stay
+            if extension is not None and os.path.exists(self.destination):
+                os.remove(self.destination)
+            logger.debug(f"NotesExporter.export: cancelled after {self.done} notes.")
+            return self.done
+        self.report(force=True)
+        logger.debug(f"NotesExporter.export: {self.done} notes to {self.destination} in {time.perf_counter() - start:.2f}s.")
+        return self.done
+
+    def note_folders(self) -> List[str]:
+        # The folder of every note, "" without folders per notebook
+        return [get_clean_string(note.notebook.name).strip() or "Untitled" if self.folders else "" for note in self.notes]
+
+    def paths(self, taken: Iterable[str] = ()) -> List[str]:
+        return unique_names(zip(self.note_folders(), (note.name for note in self.notes)), self.extension, taken)
+
+    def report(self, force: bool = False):
+        # Progress at most every 100 ms
+        if self.progress is not None and (force or time.perf_counter() - self.last_progress >= 0.1):
+            self.last_progress = time.perf_counter()
+            self.progress(self.done, len(self.notes))
+
+    def map(self, function: Callable, items: Iterable):
+        # Like executor.map, in order, with a bounded number of results in flight
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export") as executor:
+            futures = deque()
+            for item in items:
+                if self.cancelled.is_set():
+                    break
+                futures.append(executor.submit(function, *item))
+                if len(futures) >= 4 * self.workers:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+
+    def export_directory(self):
+        # Only the top level and the folders that are written to are listed, the destination may be a home directory
+        os.makedirs(self.destination, exist_ok=True)
+        taken = os.listdir(self.destination)
+        for folder in set(self.note_folders()) - {""}:
+            if os.path.isdir(directory := os.path.join(self.destination, folder)):
+                taken += [f"{folder}/{name}" for name in os.listdir(directory)]
+        paths = self.paths(taken)
+        for folder in {os.path.dirname(path) for path in paths if "/" in path}:
+            os.makedirs(os.path.join(self.destination, folder), exist_ok=True)
+
+        def write(path: str, note: Note):
+            with open(os.path.join(self.destination, *path.split("/")), "wb") as f:
+                f.write(render(note, self.format))
+
+        for _ in self.map(write, zip(paths, self.notes)):
+            self.done += 1
+            self.report()
+
+    def export_archive(self, extension: str):
+        paths = self.paths()
+        rendered = self.map(lambda note: render(note, self.format), ((note,) for note in self.notes))
+        if extension == ".zip":
+            with zipfile.ZipFile(self.destination, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                for path, data in zip(paths, rendered):
+                    archive.writestr(path, data)
+                    self.done += 1
+                    self.report()
+        else:
+            mode = "w" if extension == ".tar" else "w:gz"
+            with tarfile.open(self.destination, mode) as archive:
+                now = time.time()
+                for path, data in zip(paths, rendered):
+                    info = tarfile.TarInfo(path)
+                    info.size = len(data)
+                    info.mtime = now
+                    archive.addfile(info, io.BytesIO(data))
+                    self.done += 1
+                    self.report()
+
+    def export_jsonl(self):
+        # One JSON object per note, with the raw contents
+        def serialize(note: Note) -> str:
+            return json.dumps({
+                "uid": note.uid,
+                "name": note.name,
+                "notebook": note.notebook.name,
+                "notebook_uid": note.notebook.uid,
+                "content": note.get_content(cache=False).decode(errors="replace"),
+            }, ensure_ascii=False) + "\n"
+
+        with open(self.destination, "w", encoding="utf-8") as f:
+            for line in self.map(serialize, ((note,) for note in self.notes)):
+                f.write(line)
+                self.done += 1
+                self.report()
@@ -0,0 +1,63 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Tuple
+
+from .__version__ import __title__
+from .etesync import EtesyncNotes, Note, Notebook
+from .settings import get_settings
+
+
+logger = logging.getLogger("logger")
+settings = get_settings(__title__)
+
+
+class FetchScheduler(object):
+    def __init__(self, api: EtesyncNotes, concurrency: int = None):
+        self.api = api
+        self.concurrency = max(1, concurrency or settings.value("tasks/fetch/concurrency", type=int))
+
+    def iter_note_changes(self, notebooks: List[Notebook]) -> Iterator[Tuple[List[Note], List[str]]]:
+        # Fetch and decrypt the changes of several notebooks at once, pages are yielded as soon as any worker has one
+        if not notebooks:
+            return
+
+        pages = queue.Queue(maxsize=2 * self.concurrency)
+        cancelled = threading.Event()
+
+        def put(page):
+            # Bounded queue, give up when the consumer stopped iterating
+            while not cancelled.is_set():
+                try:
+                    pages.put(page, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def fetch(notebook: Notebook):
+            try:
+                for page in self.api.iter_note_changes(notebook):
+                    if cancelled.is_set():
+                        return
+                    put(page)
+            finally:
+                put(None)
+
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(notebooks)), thread_name_prefix="fetch") as executor:
+            futures = [executor.submit(fetch, notebook) for notebook in notebooks]
+            try:
+                remaining = len(futures)
+                while remaining:
+                    page = pages.get()
+                    if page is None:
+                        remaining -= 1
+                    else:
+                        yield page
+            finally:
+                cancelled.set()
+
+        for future in futures:
+            future.result()  # raise the first error of a worker
+
+        logger.debug(f"FetchScheduler.iter_note_changes: fetched {len(notebooks)} notebooks with {self.concurrency} workers.")
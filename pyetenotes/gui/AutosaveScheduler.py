@@ -0,0 +1,56 @@
+import logging
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import pyqtSignal
+
+from ..__version__ import __title__
+from ..settings import Settings
+
+
+logger = logging.getLogger("logger")
+settings = Settings(__title__)
+
+
+class AutosaveScheduler(QtCore.QObject):
+    # Emits save once editing pauses for the idle time, or at the latest max delay after the first unsaved edit
+    save = pyqtSignal()
+
+    def __init__(self, parent: QtCore.QObject = None):
+        super(AutosaveScheduler, self).__init__(parent)
+        self.idle_timer = QtCore.QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.max_delay_timer = QtCore.QTimer(self)
+        self.max_delay_timer.setSingleShot(True)
+        self.load_settings()
+        self.link_callbacks()
+
+    def load_settings(self):
+        self.enabled = settings.value("autosave/enabled", type=bool)
+        self.idle = 1000 * settings.value("autosave/idle", type=int)
+        self.max_delay = 1000 * settings.value("autosave/maxdelay", type=int)
+        if not self.enabled:
+            self.cancel()
+
+    def set_enabled(self, enabled: bool):
+        settings.setValue("autosave/enabled", enabled)
+        self.load_settings()
+
+    def edited(self):
+        if not self.enabled:
+            return
+        self.idle_timer.start(self.idle)
+        if not self.max_delay_timer.isActive():
+            self.max_delay_timer.start(self.max_delay)
+
+    def cancel(self):
+        self.idle_timer.stop()
+        self.max_delay_timer.stop()
+
+    def timeout_callback(self):
+        self.cancel()
+        logger.debug("AutosaveScheduler.timeout_callback: autosaving.")
+        self.save.emit()
+
+    def link_callbacks(self):
+        self.idle_timer.timeout.connect(self.timeout_callback)
+        self.max_delay_timer.timeout.connect(self.timeout_callback)
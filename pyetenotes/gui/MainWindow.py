@@ -10,14 +10,14 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 from ..__version__ import __title__
 from ..etesync import EtesyncNotes, Note, Notebook
 from ..settings import Settings
-from ..tasks import CreateNotebookTask, CreateNoteTask, ExportNoteTask, ExportNotesTask, SaveNotesTask, TasksThread
-from .themes import set_theme
-from ..utils import get_clean_string
+from ..executor import TaskExecutor
+from ..export import ARCHIVE_EXTENSIONS, JSONL_EXTENSION
+from ..tasks import (CacheLoadTask, CreateNotebookTask, CreateNoteTask, ExportNoteTask, ExportNotesTask, ImportNotesTask, SaveNotesTask,
+                     TasksThread)
+from ..utils import StartupTimer, get_clean_string
 from .designs.mainwindow import Ui_MainWindow
-from .AuthenticationDialog import AuthenticationDialog
-from .ShortcutDialog import ShortcutsDialog
-from .NewNotebookDialog import NewNotebookDialog
-from .NewNoteDialog import NewNoteDialog
+from .AutosaveScheduler import AutosaveScheduler
+from .MarkdownRenderer import MarkdownRenderer
 from .NotesTabWidget import NotesTabWidget
 from .NotesTreeWidget import NotesTreeWidget
 from .NoteTabEntryWidget import NoteTabEntryWidget
@@ -25,18 +25,29 @@ from .NoteTabEntryWidget import NoteTabEntryWidget
 logger = logging.getLogger("logger")
 settings = Settings(__title__)
 
+# ms, restore the cache after this delay when the window was not painted before
+RESTORE_DELAY = 500
+
+EXPORT_FILE_FILTERS = {
+    "Zip archive (*.zip)": ".zip",
+    "Tar archive (*.tar.gz)": ".tar.gz",
+    "JSON lines (*.jsonl)": ".jsonl",
+}
+
 
 class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
-    def __init__(self, app: QtWidgets.QApplication, api: EtesyncNotes):
+    def __init__(self, app: QtWidgets.QApplication, api: EtesyncNotes, startup_timer: StartupTimer = None):
         super(MainWindow, self).__init__()
         self.setupUi(self)
         self.app = app
         self.api = api
+        self.startup_timer = startup_timer or StartupTimer()
+        self.restored = False
+        self.cache_loaded = False
 
     def init_ui(self):
         self.setWindowTitle(__title__)
         self.app.setWindowIcon(QtGui.QIcon("logo.ico"))
-        self.statusbar.hide()
         self.pb_save.setDisabled(True)
         self.actionSave.setDisabled(True)
         self.set_size_button_sizes()
@@ -45,7 +56,10 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
         self.actionGroupTheme = QtWidgets.QActionGroup(self.menuTheme)
         self.actionGroupTheme.setExclusive(True)
         current_theme: str = settings.value("style", type=str)
-        set_theme(self.app, current_theme)
+        if current_theme != "default":
+            # The default palette is already set, the themes are imported when used
+            from .themes import set_theme
+            set_theme(self.app, current_theme)
         for name in ["Default", "Dark Green", "Light Green"]:
             action = QtWidgets.QAction(name, self.menuTheme, checkable=True)
             if current_theme == name.lower().replace(" ", ""):
@@ -54,6 +68,9 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
             self.menuTheme.addAction(action)
 
         # Task update_notebooks
+        self.actionFetchChangesNow = QtWidgets.QAction("Now", self.menuFetchChanges)
+        self.menuFetchChanges.addAction(self.actionFetchChangesNow)
+        self.menuFetchChanges.addSeparator()
         self.actionGroupFetchChanges = QtWidgets.QActionGroup(self.menuFetchChanges)
         self.actionGroupFetchChanges.setExclusive(True)
         current_interval = settings.value("tasks/update_notebooks/interval", type=int)
@@ -65,20 +82,80 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
             self.actionGroupFetchChanges.addAction(action)
             self.menuFetchChanges.addAction(action)
 
+        # Autosave
+        self.actionAutosave = QtWidgets.QAction("Autosave", self.menuEdit, checkable=True)
+        self.actionAutosave.setChecked(settings.value("autosave/enabled", type=bool))
+        self.menuEdit.addAction(self.actionAutosave)
+
+        # Import
+        self.actionImport_Folder = QtWidgets.QAction("Import Folder...", self.menuSettings)
+        self.actionImport_Archive = QtWidgets.QAction("Import Archive...", self.menuSettings)
+        self.menuSettings.insertAction(self.actionExport, self.actionImport_Folder)
+        self.menuSettings.insertAction(self.actionExport, self.actionImport_Archive)
+        self.menuSettings.insertSeparator(self.actionExport)
+
+        # Export
+        self.actionExport_All_to_File = QtWidgets.QAction("Export All to File...", self.menuSettings)
+        self.menuExportFormat = QtWidgets.QMenu("Export Format", self.menuSettings)
+        self.actionGroupExportFormat = QtWidgets.QActionGroup(self.menuExportFormat)
+        self.actionGroupExportFormat.setExclusive(True)
+        current_format = settings.value("export/format", type=str)
+        for name, export_format in [("Text", "txt"), ("Markdown", "md"), ("HTML", "html")]:
+            action = QtWidgets.QAction(name, self.menuExportFormat, checkable=True)
+            action.format = export_format
+            if export_format == current_format:
+                action.setChecked(True)
+            self.actionGroupExportFormat.addAction(action)
+            self.menuExportFormat.addAction(action)
+        self.menuExportFormat.addSeparator()
+        self.actionExportFolders = QtWidgets.QAction("One Folder per Notebook", self.menuExportFormat, checkable=True)
+        self.actionExportFolders.setChecked(settings.value("export/folders", type=bool))
+        self.menuExportFormat.addAction(self.actionExportFolders)
+        menu_actions = self.menuSettings.actions()
+        before = menu_actions[menu_actions.index(self.actionExport_All) + 1]
+        self.menuSettings.insertAction(before, self.actionExport_All_to_File)
+        self.menuSettings.insertMenu(before, self.menuExportFormat)
+
+        self.markdown_renderer = MarkdownRenderer()
+        self.markdown_renderer.start()
+        self.task_executor = TaskExecutor()
+        self.autosave_scheduler = AutosaveScheduler(self)
         self.notes_tree_widget = NotesTreeWidget(self)
         self.notes_tab_widget = NotesTabWidget(self)
         self.splitter_tree.insertWidget(0, self.notes_tree_widget)
         self.splitter_tree.insertWidget(1, self.notes_tab_widget)
 
-        self.cache_load()
-        
         self.tasks_thread = TasksThread(self.api)
 
         self.restore_window_state()
         self.init_shortcuts()
         self.update_shortcuts()
         self.link_callbacks()
-        self.tasks_thread.start()
+        self.startup_timer.mark("ui")
+
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        super(MainWindow, self).paintEvent(event)
+        if not self.restored:
+            # The cache is restored once the window is on screen
+            self.startup_timer.mark("first paint")
+            QtCore.QTimer.singleShot(0, self.restore)
+
+    def restore(self):
+        # Load the cached notes into the tree as they are deserialized, then start syncing
+        if self.restored:
+            return
+        self.restored = True
+        cache_load_task = CacheLoadTask(self.api)
+        cache_load_task.notebooks_loaded.connect(self.cache_notebooks_loaded)
+        cache_load_task.notes_loaded.connect(lambda notes: self.notes_tree_widget.add_notes(notes, bulk=True))
+        cache_load_task.finished.connect(self.cache_load_finished)
+        self.task_executor.submit(cache_load_task)
+
+    def report_startup(self):
+        report = f"Startup: {self.startup_timer.report()}."
+        logger.debug(report)
+        if "--startup-timing" in sys.argv:
+            print(report, file=sys.stderr)
 
     def set_size_button_sizes(self):
         self.pb_save.setFixedHeight(30)
@@ -87,12 +164,19 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
         self.pb_new_notebook.setFixedHeight(30)
         self.combo_view.setFixedHeight(30)
 
-    def cache_load(self):
-        notebooks, notes = self.api.cache_load()
-        self.notes_tree_widget.restore(notebooks, notes)
+    def cache_notebooks_loaded(self, notebooks: List[Notebook]):
+        self.notes_tree_widget.restore(notebooks, ())
+        self.startup_timer.mark("notebooks restored")
+
+    def cache_load_finished(self):
+        # Also after a failed load, syncing fills the tree then
+        self.cache_loaded = True
+        self.startup_timer.mark("cache restored")
+        self.tasks_thread.start()
+        self.report_startup()
 
     def cache_save(self):
-        self.api.cache_save(self.notes_tree_widget.find_notebooks(), self.notes_tree_widget.find_notes())
+        self.api.cache_save()
 
     def open_note(self, title: str, note: Note):
         if (index := self.notes_tab_widget.note_is_opened(note)) < 0:
@@ -100,70 +184,95 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
         self.notes_tab_widget.select_tab(index)
 
     def save_notes(self) -> bool:
-        notes = []
-        for note_widget in self.notes_tab_widget.opened_note_widgets():
-            note = note_widget.note
-            if not note.changed:
-                continue
-            note.content = note_widget.note_edit_widget.toPlainText().encode()
-            notes.append(note)
+        return self.save_note_widgets(self.notes_tab_widget.opened_note_widgets())
+
+    def autosave_notes(self):
+        # Notes with unresolved conflict markers are only saved explicitly
+        note_widgets = [note_widget for note_widget in self.notes_tab_widget.opened_note_widgets() if note_widget.is_dirty()]
+        conflicted = [note_widget for note_widget in note_widgets if note_widget.has_conflicts()]
+        if conflicted:
+            self.statusbar.showMessage(f"Not autosaved: {len(conflicted)} note{'s' if len(conflicted) > 1 else ''} with unresolved conflicts.", 5000)
+        self.save_note_widgets([note_widget for note_widget in note_widgets if note_widget not in conflicted])
+
+    def save_note_widgets(self, note_widgets: List[NoteTabEntryWidget]) -> bool:
+        notes = [note_widget.snapshot() for note_widget in note_widgets if note_widget.is_dirty()]
 
         if not notes:
             return False
 
-        self.save_all_notes_task = SaveNotesTask(api=self.api, notes=notes)
-        self.save_all_notes_task.started.connect(self.save_started)
-        self.save_all_notes_task.finished.connect(self.save_finished)
-        self.save_all_notes_task.failed.connect(self.save_failed)
-        self.save_all_notes_task.start()
+        self.autosave_scheduler.cancel()
+        self.submit_save(notes)
         return True
 
     def save_note(self):
         # Save the currently displayed note
         note_widget: NoteTabEntryWidget = self.notes_tab_widget.currentWidget()
-        if not note_widget:
-            return
-        if not note_widget.note.changed:
+        if not note_widget or not note_widget.is_dirty():
             return
-        note = note_widget.note
-        note.content = note_widget.note_edit_widget.toPlainText().encode()
-
-        self.save_note_task = SaveNotesTask(api=self.api, notes=[note])
-        self.save_note_task.started.connect(self.save_started)
-        self.save_note_task.finished.connect(self.save_finished)
-        self.save_note_task.failed.connect(self.save_failed)
-        self.save_note_task.start()
+        self.submit_save([note_widget.snapshot()])
+
+    def submit_save(self, notes: List[Note]):
+        # Contents of all notes are uploaded in one task, after earlier tasks on the same notes
+        task = SaveNotesTask(self.api, notes)
+        task.started.connect(self.save_started)
+        task.saved.connect(self.save_finished)
+        task.failed.connect(self.save_failed)
+        task.notes_queued.connect(self.notes_save_queued)
+        self.task_executor.submit(task)
+
+    def update_save_actions(self):
+        note_widget: NoteTabEntryWidget = self.notes_tab_widget.currentWidget()
+        dirty = bool(note_widget) and note_widget.is_dirty()
+        self.pb_save.setEnabled(dirty)
+        self.actionSave.setEnabled(dirty)
 
     def save_started(self):
-        self.pb_save.setDisabled(True)
-        self.pb_save_all.setDisabled(True)
-        self.actionSave.setDisabled(True)
-        self.actionSave_All.setDisabled(True)
         self.statusbar.showMessage("Saving...")
 
-    def save_finished(self):
-        self.pb_save_all.setEnabled(True)
-        self.actionSave_All.setEnabled(True)
+    def save_finished(self, notes: List[Note]):
+        self.update_save_actions()
+        # The saved contents are in the cache now
+        self.notes_tree_widget.index_notes(note.uid for note in notes)
+        if notes:
+            # Pick up changes that were made elsewhere in the meantime
+            self.tasks_thread.wake()
+        if stats := self.task_executor.task_stats("SaveNotesTask"):
+            upload, queued = stats["run"], stats["queued"]
+            self.statusbar.setToolTip(
+                f"Uploads: {upload['count']}, last {upload['last']:.2f}s, mean {upload['mean']:.2f}s, p95 {upload['p95']:.2f}s\n"
+                f"Queued: mean {queued['mean']:.2f}s, p95 {queued['p95']:.2f}s, max {queued['max']:.2f}s"
+            )
         self.statusbar.showMessage("Saved.", 5000)
 
     def save_failed(self):
-        self.pb_save_all.setEnabled(True)
-        self.actionSave_All.setEnabled(True)
+        self.update_save_actions()
         self.statusbar.showMessage("Save failed.", 5000)
 
-    def export_notes(self) -> bool:
-        notes = self.notes_tree_widget.find_notes()
-        if not notes:
+    def notes_save_queued(self, notes: List[Note]):
+        # The notes are journaled in the outbox and uploaded by a later sync
+        self.update_save_actions()
+        self.notes_tree_widget.index_notes(note.uid for note in notes)
+        self.statusbar.showMessage(f"Saved offline, {len(notes)} note{'s' if len(notes) > 1 else ''} will be uploaded once the connection is back.", 5000)
+
+    def export_notes(self, to_file: bool = False) -> bool:
+        uids = self.notes_tree_widget.find_note_uids()
+        if not uids:
             return False
 
-        savedir = QtWidgets.QFileDialog.getExistingDirectory(self, "Export", settings.value("export/path", type=str))
-        if savedir and os.path.exists(savedir):
-            settings.setValue("export/path", savedir)
-            self.export_all_notes_task = ExportNotesTask(notes, savedir, settings.value("export/extension", type=str))
-            self.export_all_notes_task.started.connect(self.export_started)
-            self.export_all_notes_task.finished.connect(self.export_finished)
-            self.export_all_notes_task.failed.connect(self.export_failed)
-            self.export_all_notes_task.start()
+        if to_file:
+            # A single archive or JSON lines file
+            destination, selected_filter = QtWidgets.QFileDialog.getSaveFileName(
+                self, "Export", os.path.join(settings.value("export/path", type=str), __title__), ";;".join(EXPORT_FILE_FILTERS)
+            )
+            if destination and not destination.lower().endswith(tuple(ARCHIVE_EXTENSIONS + [JSONL_EXTENSION])):
+                destination += EXPORT_FILE_FILTERS.get(selected_filter, ".zip")
+            directory = os.path.dirname(destination)
+        else:
+            destination = directory = QtWidgets.QFileDialog.getExistingDirectory(self, "Export", settings.value("export/path", type=str))
+
+        if destination and os.path.exists(directory):
+            settings.setValue("export/path", directory)
+            self.submit_export(ExportNotesTask(self.api, uids, destination))
             return True
         else:
             return False
@@ -175,44 +284,97 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
             return
         note = note_widget.note
 
+        export_format = settings.value("export/format", type=str)
         fname = QtWidgets.QFileDialog.getSaveFileName(
             self,
             "Export",
             os.path.join(settings.value("export/path", type=str), get_clean_string(note.name)),
-            "*." + settings.value("export/extension", type=str)
+            "*." + (settings.value("export/extension", type=str) if export_format == "txt" else export_format)
         )[0]
 
         if fname and os.path.exists(os.path.dirname(fname)):
             settings.setValue("export/path", os.path.dirname(fname))
-            self.export_note_task = ExportNoteTask(note, fname)
-            self.export_note_task.started.connect(self.export_started)
-            self.export_note_task.finished.connect(self.export_finished)
-            self.export_note_task.failed.connect(self.export_failed)
-            self.export_note_task.start()
+            self.submit_export(ExportNoteTask(note, fname))
+
+    def submit_export(self, export_task: Union[ExportNoteTask, ExportNotesTask]):
+        export_task.started.connect(self.export_started)
+        export_task.finished.connect(self.export_finished)
+        export_task.failed.connect(self.export_failed)
+        if isinstance(export_task, ExportNotesTask):
+            export_task.progress.connect(self.export_progress)
+        self.task_executor.submit(export_task)
+
+    def set_export_actions_enabled(self, enabled: bool):
+        for action in [self.actionExport, self.actionExport_All, self.actionExport_All_to_File]:
+            action.setEnabled(enabled)
 
     def export_started(self):
-        self.actionExport_All.setDisabled(True)
-        self.actionExport.setDisabled(True)
+        self.set_export_actions_enabled(False)
         self.statusbar.showMessage("Exporting...")
 
+    def export_progress(self, done: int, total: int):
+        self.statusbar.showMessage(f"Exporting... {done}/{total}")
+
     def export_finished(self):
-        self.actionExport_All.setEnabled(True)
-        self.actionExport.setEnabled(True)
+        self.set_export_actions_enabled(True)
         self.statusbar.showMessage("Export finished.", 5000)
 
     def export_failed(self):
-        self.actionExport_All.setEnabled(True)
-        self.actionExport.setEnabled(True)
+        self.set_export_actions_enabled(True)
         self.statusbar.showMessage("Export failed.", 5000)
 
+    def export_format_selected_callback(self, action: QtWidgets.QAction):
+        settings.setValue("export/format", action.format)
+
+    def import_notes(self, archive: bool = False):
+        # Markdown and text files of a folder or a zip archive, one notebook per folder
+        if archive:
+            source = QtWidgets.QFileDialog.getOpenFileName(self, "Import", settings.value("import/path", type=str), "Zip archive (*.zip)")[0]
+        else:
+            source = QtWidgets.QFileDialog.getExistingDirectory(self, "Import", settings.value("import/path", type=str))
+        if not source or not os.path.exists(source):
+            return
+
+        settings.setValue("import/path", os.path.dirname(source) if archive else source)
+        import_task = ImportNotesTask(self.api, source)
+        import_task.started.connect(self.import_started)
+        import_task.progress.connect(lambda done, total: self.statusbar.showMessage(f"Importing... {done}/{total}"))
+        import_task.imported.connect(self.notes_imported)
+        import_task.failed.connect(self.import_failed)
+        self.task_executor.submit(import_task)
+
+    def set_import_actions_enabled(self, enabled: bool):
+        self.actionImport_Folder.setEnabled(enabled)
+        self.actionImport_Archive.setEnabled(enabled)
+
+    def import_started(self):
+        self.set_import_actions_enabled(False)
+        self.statusbar.showMessage("Importing...")
+
+    def notes_imported(self, imported: int, skipped: int, queued: int):
+        self.set_import_actions_enabled(True)
+        message = f"Imported {imported} note{'s' if imported != 1 else ''}"
+        if skipped:
+            message += f", {skipped} skipped (imported before)"
+        if queued:
+            message += f", {queued} will be uploaded once the connection is back"
+        self.statusbar.showMessage(message + ".", 5000)
+        # The new notebooks and notes come with the next sync
+        self.tasks_thread.wake()
+
+    def import_failed(self):
+        self.set_import_actions_enabled(True)
+        self.statusbar.showMessage("Import failed, importing again resumes where it stopped.", 5000)
+
     def new_note_callback(self, selected_notebook: Notebook = None):
+        from .NewNoteDialog import NewNoteDialog
         dialog = NewNoteDialog(self, self.notes_tree_widget.find_notebooks(), selected_notebook)
         accepted = dialog.exec_()
         if accepted and dialog.line_name.text() and dialog.combo_notebooks.currentText():
             notebook = self.notes_tree_widget.find_notebook(dialog.combo_notebooks.currentText())
-            self.create_note_task = CreateNoteTask(self.api, dialog.line_name.text(), notebook)
-            self.create_note_task.created.connect(self.note_created_callback)
-            self.create_note_task.start()
+            create_task = CreateNoteTask(self.api, dialog.line_name.text(), notebook)
+            create_task.created.connect(self.note_created_callback)
+            self.task_executor.submit(create_task)
 
     def note_created_callback(self, note: Note):
         self.notes_tree_widget.add_note(note, note.notebook)
@@ -220,17 +382,18 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
         self.notes_tab_widget.select_tab(index)
 
     def new_notebook_callback(self):
+        from .NewNotebookDialog import NewNotebookDialog
         dialog = NewNotebookDialog(self)
         accepted = dialog.exec_()
         if accepted and dialog.line_name.text():
-            self.create_notebook_task = CreateNotebookTask(
+            create_task = CreateNotebookTask(
                 self.api,
                 dialog.line_name.text(),
                 dialog.line_description.text(),
                 dialog.color_name
             )
-            self.create_notebook_task.created.connect(lambda notebook: self.notes_tree_widget.add_notebook(notebook))
-            self.create_notebook_task.start()
+            create_task.created.connect(lambda notebook: self.notes_tree_widget.add_notebook(notebook))
+            self.task_executor.submit(create_task)
 
     def view_currentTextChanged_callback(self, text: str):
         current_note_widget: NoteTabEntryWidget = self.notes_tab_widget.currentWidget()
@@ -260,6 +423,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
             opened_note_widget.note_preview_widget.set_font(font)
 
     def theme_selected_callback(self, action: QtWidgets.QAction):
+        from .themes import set_theme
         theme = action.text().lower().replace(" ", "")
         set_theme(self.app, theme)
         settings.setValue("style", theme)
@@ -268,14 +432,19 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
         settings.setValue("tasks/update_notebooks/interval", action.interval)
         self.tasks_thread.set_schedule()
 
+    def application_state_changed_callback(self, state: QtCore.Qt.ApplicationState):
+        if state == QtCore.Qt.ApplicationActive:
+            self.tasks_thread.wake(settings.value("tasks/update_notebooks/focus_interval", type=int))
+
     def shortcuts_callback(self):
+        from .ShortcutDialog import ShortcutsDialog
         dialog = ShortcutsDialog(self)
         dialog.exec_()
         self.update_shortcuts()
 
     def new_updates_signal_callback(self, updates: Dict[str, Union[List[Notebook], List[Note]]]):
         for notebook in updates['notebooks']:
-            if list(filter(lambda nb: nb.uid == notebook.uid, self.notes_tree_widget.find_notebooks())):
+            if self.notes_tree_widget.find_notebook_record(notebook):
                 # update an existing notebook
                 self.notes_tree_widget.update_notebooks([notebook])
                 logger.debug(f"tasks_updated_notes_callback: Updated notebook \"{notebook.name}\".")
@@ -284,16 +453,42 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
                 self.notes_tree_widget.add_notebook(notebook)
                 logger.debug(f"tasks_updated_notes_callback: Added new notebook \"{notebook.name}\".")
 
+        updated_notes, new_notes = [], []
         for note in updates['notes']:
-            if list(filter(lambda n: n.uid == note.uid, self.notes_tree_widget.find_notes())):
-                # update an existing note
-                self.notes_tree_widget.update_notes([note])
-                self.notes_tab_widget.update_notes([note])
-                logger.debug(f"tasks_updated_notes_callback: Updated note \"{note.name}\" in notebook \"{note.notebook.name}\".")
+            if self.notes_tree_widget.find_note_record(note):
+                updated_notes.append(note)
             else:
-                # New note
-                self.notes_tree_widget.add_note(note, note.notebook)
-                logger.debug(f"tasks_updated_notes_callback: Added new note \"{note.name}\" to notebook \"{note.notebook.name}\".")
+                new_notes.append(note)
+
+        if updated_notes:
+            self.notes_tree_widget.update_notes(updated_notes)
+            self.notes_tab_widget.update_notes(updated_notes)
+            logger.debug(f"tasks_updated_notes_callback: Updated {len(updated_notes)} notes.")
+
+        if new_notes:
+            self.notes_tree_widget.add_notes(new_notes)
+            logger.debug(f"tasks_updated_notes_callback: Added {len(new_notes)} new notes.")
+
+        if removed_notes := set(updates['removed_notes']):
+            self.notes_tree_widget.remove_notes(removed_notes)
+            logger.debug(f"tasks_updated_notes_callback: Removed {len(removed_notes)} notes.")
+
+        if removed_notebooks := set(updates['removed_notebooks']):
+            self.notes_tree_widget.remove_notebooks(removed_notebooks)
+            logger.debug(f"tasks_updated_notes_callback: Removed {len(removed_notebooks)} notebooks.")
+
+    def outbox_report_callback(self, copies: List[str], dropped: int, stuck: int):
+        messages = []
+        if copies:
+            messages.append("Changed on the server in the meantime, your changes were saved as:\n" + "\n".join(copies))
+        if dropped:
+            messages.append(f"{dropped} change{'s' if dropped > 1 else ''} to removed notebooks could not be uploaded and {'were' if dropped > 1 else 'was'} dropped.")
+        if stuck:
+            messages.append(
+                f"{stuck} change{'s' if stuck > 1 else ''} could not be uploaded after {settings.value('etesync/outbox/maxattempts', type=int)} attempts. "
+                "Saving the note again retries it."
+            )
+        QtWidgets.QMessageBox.warning(self, "Sync", "\n\n".join(messages))
 
     def logout(self):
         response = QtWidgets.QMessageBox.warning(
@@ -354,7 +549,12 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
         self.actionClose.triggered.connect(self.notes_tab_widget.close_current_tab)
         self.actionClose_All.triggered.connect(self.notes_tab_widget.close_all_tabs)
         self.actionExport.triggered.connect(self.export_note)
-        self.actionExport_All.triggered.connect(self.export_notes)
+        self.actionImport_Folder.triggered.connect(lambda: self.import_notes())
+        self.actionImport_Archive.triggered.connect(lambda: self.import_notes(archive=True))
+        self.actionExport_All.triggered.connect(lambda: self.export_notes())
+        self.actionExport_All_to_File.triggered.connect(lambda: self.export_notes(to_file=True))
+        self.actionGroupExportFormat.triggered.connect(self.export_format_selected_callback)
+        self.actionExportFolders.toggled.connect(lambda checked: settings.setValue("export/folders", checked))
         self.actionLogout.triggered.connect(self.logout)
         self.actionQuit.triggered.connect(self.close)
         self.actionChange_edit_font.triggered.connect(self.change_edit_font_callback)
@@ -362,8 +562,13 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
         self.actionShortcuts.triggered.connect(self.shortcuts_callback)
         self.actionGroupTheme.triggered.connect(self.theme_selected_callback)
         self.actionGroupFetchChanges.triggered.connect(self.fetch_changes_selected_callback)
+        self.actionFetchChangesNow.triggered.connect(lambda: self.tasks_thread.wake())
+        self.app.applicationStateChanged.connect(self.application_state_changed_callback)
+        self.actionAutosave.toggled.connect(self.autosave_scheduler.set_enabled)
+        self.autosave_scheduler.save.connect(self.autosave_notes)
 
         self.tasks_thread.new_updates_signal[dict].connect(self.new_updates_signal_callback)
+        self.tasks_thread.outbox_report_signal.connect(self.outbox_report_callback)
 
         self.shortcut_new_note.activated.connect(self.new_note_callback)
         self.shortcut_new_notebook.activated.connect(self.new_notebook_callback)
@@ -405,12 +610,20 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
         settings.setValue("mainwindow/splitter_tree", self.splitter_tree.saveState())
 
     def handle_close(self):
-        save_started = self.save_notes()
-        self.cache_save()
+        self.save_notes()
+        if self.cache_loaded:
+            self.cache_save()
         self.save_window_state()
+        self.notes_tree_widget.stop_indexing()
+        self.tasks_thread.stop()
+        self.markdown_renderer.stop()
+        self.markdown_renderer.wait()
+        # Stop the imports and exports, finish the queued uploads
+        self.task_executor.cancel_tasks()
+        self.task_executor.shutdown()
+        self.tasks_thread.wait()
+        # Only once nothing writes to the cache anymore
         self.lock_file.unlock()
-        if save_started:
-            self.save_all_notes_task.wait()
 
     def closeEvent(self, event: QtGui.QCloseEvent) -> None:
         self.handle_close()
@@ -420,19 +633,17 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow, QtCore.QCoreApplication):
 
 def authenticate(api: EtesyncNotes) -> bool:
     # Check for a stored session
-    encryption_key = settings.value("session/key", type=bytes)
-    stored_session = settings.value("session/sessiondata", type=str)
-    server_url = settings.value("session/url", type=str)
-    if encryption_key and stored_session and server_url:
-        api.restore_session(encryption_key, stored_session, server_url)
+    if api.restore_stored_session():
         logger.debug("Restored previous session.")
         return True
 
     # No stored session available
+    server_url = settings.value("session/url", type=str)
     username = None
     password = None
     stay_logged_in = True
 
+    from .AuthenticationDialog import AuthenticationDialog
     while not api.authenticated:
         dialog = AuthenticationDialog(username, password, server_url, stay_logged_in)
         accepted = dialog.exec_()
@@ -454,11 +665,13 @@ def authenticate(api: EtesyncNotes) -> bool:
     return api.authenticated
 
 
-def start_gui():
+def start_gui(startup_timer: StartupTimer = None):
+    startup_timer = startup_timer or StartupTimer()
     api = EtesyncNotes()
     app = QtWidgets.QApplication(sys.argv)
     app.setStyle("fusion")
-    window = MainWindow(app, api)
+    window = MainWindow(app, api, startup_timer)
+    startup_timer.mark("window")
 
     logdir = QtCore.QStandardPaths.standardLocations(QtCore.QStandardPaths.DataLocation)[0]
     if not os.path.exists(logdir):
@@ -471,7 +684,10 @@ def start_gui():
         return
 
     if authenticate(api):
-        # Initialize and show the main window
+        startup_timer.mark("authentication")
+        # Initialize and show the main window, the cache is restored after the first paint
         window.init_ui()
         window.show()
+        # In case the window is not painted (e.g. it starts minimized)
+        QtCore.QTimer.singleShot(RESTORE_DELAY, window.restore)
         sys.exit(app.exec_())
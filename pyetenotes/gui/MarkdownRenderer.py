@@ -0,0 +1,74 @@
+import logging
+import threading
+import time
+from typing import Dict, Hashable, Tuple
+
+from PyQt5 import QtCore, QtGui
+from PyQt5.QtCore import pyqtSignal
+
+
+logger = logging.getLogger("logger")
+
+
+class MarkdownRenderer(QtCore.QThread):
+    # key, revision, QTextDocument, render duration in ms
+    rendered = pyqtSignal(object, int, object, int)
+
+    def __init__(self):
+        super(MarkdownRenderer, self).__init__()
+        self.running = False
+        self.condition = threading.Condition()
+        self.revision = 0
+        self.pending: Dict[Hashable, Tuple[int, str, QtGui.QFont]] = {}
+        self.latest: Dict[Hashable, int] = {}  # key -> revision of its most recent request
+
+    def render(self, key: Hashable, text: str, font: QtGui.QFont) -> int:
+        # Queue text for key, replacing a request that did not start yet. Returns the request's revision.
+        with self.condition:
+            self.revision += 1
+            self.pending[key] = (self.revision, text, QtGui.QFont(font))
+            self.latest[key] = self.revision
+            self.condition.notify()
+            return self.revision
+
+    def cancel(self, key: Hashable):
+        with self.condition:
+            self.pending.pop(key, None)
+            self.latest.pop(key, None)
+
+    def is_stale(self, key: Hashable, revision: int) -> bool:
+        with self.condition:
+            return self.latest.get(key) != revision
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.pending.clear()
+            self.condition.notify()
+
+    def start(self, *args, **kwargs):
+        self.running = True
+        super().start(*args, **kwargs)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                key, (revision, text, font) = self.pending.popitem()
+
+            start = time.perf_counter()
+            document = QtGui.QTextDocument()
+            document.setDefaultFont(font)
+            document.setMarkdown(text)
+            duration = int((time.perf_counter() - start) * 1000)
+
+            # A parse can not be interrupted, but its result is dropped when a newer revision was requested meanwhile
+            if self.is_stale(key, revision):
+                logger.debug(f"MarkdownRenderer.run: dropped stale revision {revision}.")
+                continue
+
+            document.moveToThread(QtCore.QCoreApplication.instance().thread())
+            self.rendered.emit(key, revision, document, duration)
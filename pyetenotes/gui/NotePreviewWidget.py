@@ -1,23 +1,115 @@
 import logging
+from typing import Callable
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 from ..__version__ import __title__
 from ..settings import Settings
+from ..utils import LRUCache
+from .MarkdownRenderer import MarkdownRenderer
 
 
 logger = logging.getLogger("logger")
 settings = Settings(__title__)
 
+# (note uid, markdown hash) -> QTextDocument, shared by all preview panes
+rendered_documents = LRUCache(
+    settings.value("notepreviewwidget/cache/count", type=int),
+    maxcost=settings.value("notepreviewwidget/cache/size", type=int) * 1024
+)
+
+
+def document_cost(document: QtGui.QTextDocument) -> int:
+    # Rough estimate of the memory a rendered document takes, in bytes
+    return 16 * document.characterCount() + 256 * document.blockCount()
+
 
 class NotePreviewWidget(QtWidgets.QTextBrowser):
-    def __init__(self, parent: QtWidgets.QWidget):
+    def __init__(self, parent: QtWidgets.QWidget, renderer: MarkdownRenderer, note_uid: str):
         super(NotePreviewWidget, self).__init__(parent)
+        self.renderer = renderer
+        self.note_uid = note_uid
 
         self.setOpenExternalLinks(True)
         font = settings.value("notewidget/font/preview", type=QtGui.QFont)
         self.set_font(font)
 
+        self.markdown_hash = None
+        self.revision = 0
+        self.rendered_document: QtGui.QTextDocument = None  # the widget does not own a document set with setDocument
+        self.markdown_source: Callable[[], str] = None
+        self.render_delay = settings.value("notepreviewwidget/render/delay", type=int)
+        self.render_duration = 0  # ms, of the last render
+        self.render_timer = QtCore.QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.timeout.connect(self.render_timeout_callback)
+        self.renderer.rendered.connect(self.rendered_callback)
+
     def set_font(self, font: QtGui.QFont):
         self.setTabStopWidth(4 * self.fontMetrics().width(' '))
         self.setFont(font)
+
+    def render_later(self, source: Callable[[], str]):
+        # Coalesce edits, the text is only fetched and rendered once typing pauses.
+        # Slow renders (large notes) back off further so they do not block every keystroke.
+        self.markdown_source = source
+        self.render_timer.start(max(self.render_delay, 2 * self.render_duration))
+
+    def cancel_render(self):
+        self.render_timer.stop()
+        self.markdown_source = None
+
+    def key(self) -> int:
+        return id(self)
+
+    def render_timeout_callback(self):
+        if self.markdown_source is not None:
+            self.render_markdown(self.markdown_source())
+
+    def render_markdown(self, text: str):
+        # Use a cached document or parse in the renderer thread, rendered_callback swaps the document in
+        self.cancel_render()
+        if (markdown_hash := hash(text)) == self.markdown_hash:
+            return
+        self.markdown_hash = markdown_hash
+
+        if (document := rendered_documents.get((self.note_uid, markdown_hash))) is not None:
+            # A render that is still running for older text must not replace it
+            self.renderer.cancel(self.key())
+            self.revision = 0
+            self.set_document(document)
+            logger.debug(f"NotePreviewWidget.render_markdown: cached document for {self.note_uid}.")
+            return
+
+        self.revision = self.renderer.render(self.key(), text, self.font())
+
+    def rendered_callback(self, key: int, revision: int, document: QtGui.QTextDocument, duration: int):
+        if key != self.key() or revision != self.revision:
+            return
+
+        rendered_documents.put((self.note_uid, self.markdown_hash), document, cost=document_cost(document))
+        self.set_document(document)
+        self.render_duration = duration
+        logger.debug(f"NotePreviewWidget.rendered_callback: revision {revision} rendered in {duration} ms.")
+
+    def set_document(self, document: QtGui.QTextDocument):
+        vertical_scrollbar = self.verticalScrollBar()
+        horizontal_scrollbar = self.horizontalScrollBar()
+        vertical_value, vertical_maximum = vertical_scrollbar.value(), vertical_scrollbar.maximum()
+        horizontal_value = horizontal_scrollbar.value()
+
+        if document.defaultFont() != self.font():
+            # Cached with a font that was changed since
+            document.setDefaultFont(self.font())
+        self.setDocument(document)
+        self.rendered_document = document
+        self.setTabStopWidth(4 * self.fontMetrics().width(' '))
+
+        # Keep the scroll position, stick to the bottom when it was scrolled all the way down
+        vertical_scrollbar.setValue(vertical_scrollbar.maximum() if vertical_maximum and vertical_value == vertical_maximum else vertical_value)
+        horizontal_scrollbar.setValue(horizontal_value)
+
+    def discard(self):
+        # Drop queued and running renders, the widget is about to be deleted
+        self.cancel_render()
+        self.renderer.cancel(self.key())
@@ -1,9 +1,11 @@
 import logging
+from typing import List, Tuple
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 from ..__version__ import __title__
 from ..etesync import Note
+from ..merge import diff_edits, has_conflicts, merge3, normalize_text, utf16_length
 from ..settings import Settings
 from .designs.widget_note import Ui_Form as Ui_Form_NoteWidget
 from .NoteEditWidget import NoteEditWidget
@@ -21,16 +23,20 @@ class NoteTabEntryWidget(QtWidgets.QWidget, Ui_Form_NoteWidget):
         self.mainwindow = mainwindow
         self.note = note
         self.note_edit_widget = NoteEditWidget(self.splitter)
-        self.note_preview_widget = NotePreviewWidget(self.splitter)
+        self.note_preview_widget = NotePreviewWidget(self.splitter, mainwindow.markdown_renderer, note.uid)
 
         self.gridLayout.setContentsMargins(0, 0, 0, 0)
 
         self.update_preview = True
+        self.preview_revision = -1  # document revision the preview was last rendered from
 
-        self.link_callbacks()
-
+        # Contents of the last synced version, the base for merging remote changes into local edits.
+        # Taken from the editor, which normalizes line breaks ("\r\n" becomes "\n").
         self.note_edit_widget.setPlainText(self.note.content.decode())
-        self.note.changed = False
+        self.note_edit_widget.document().setModified(False)
+        self.base_text = self.note_edit_widget.toPlainText()
+
+        self.link_callbacks()
         self.update_view(settings.value(f"noteentrywidget/{self.note.notebook.uid}/{self.note.uid}/view", "Live Preview", type=str))
 
         if splitter_state := settings.value(f"noteentrywidget/{self.note.notebook.uid}/{self.note.uid}/splitter", type=QtCore.QByteArray):
@@ -39,30 +45,101 @@ class NoteTabEntryWidget(QtWidgets.QWidget, Ui_Form_NoteWidget):
     def update_view(self, view: str):
         self.view = view
         if view == "Live Preview":
-            self.note_preview_widget.setMarkdown(self.note_edit_widget.toPlainText())
+            self.render_preview()
             self.update_preview = True
             self.note_edit_widget.setFocus()
             self.note_edit_widget.setVisible(True)
             self.note_preview_widget.setVisible(True)
         elif view == "Preview":
-            self.note_preview_widget.setMarkdown(self.note_edit_widget.toPlainText())
+            self.render_preview()
             self.note_preview_widget.setFocus()
             self.note_edit_widget.setHidden(True)
             self.note_preview_widget.setVisible(True)
         elif view == "Edit":
             self.update_preview = False
+            self.note_preview_widget.cancel_render()
             self.note_edit_widget.setFocus()
             self.note_edit_widget.setVisible(True)
             self.note_preview_widget.setHidden(True)
         settings.setValue(f"noteentrywidget/{self.note.notebook.uid}/{self.note.uid}/view", view)
 
+    def render_preview(self):
+        # The revision changes with every edit, the text is only copied when there is something new to render
+        if (revision := self.note_edit_widget.document().revision()) != self.preview_revision:
+            self.preview_revision = revision
+            self.note_preview_widget.render_markdown(self.note_edit_widget.toPlainText())
+
+    def is_modified(self) -> bool:
+        # Edited since it was opened or last saved, undoing all edits makes it unmodified again
+        return self.note_edit_widget.document().isModified()
+
+    def is_dirty(self) -> bool:
+        # Unsaved edits, or saved contents that were not uploaded yet
+        return self.is_modified() or self.note.changed
+
+    def has_conflicts(self) -> bool:
+        return has_conflicts(self.note_edit_widget.toPlainText())
+
+    def snapshot(self) -> Note:
+        # Copy the edited text into the note for uploading, only when it was modified
+        if self.is_modified():
+            self.base_text = self.note_edit_widget.toPlainText()
+            self.note.content = self.base_text.encode()
+            self.note.changed = True
+            self.note_edit_widget.document().setModified(False)
+        return self.note
+
+    def merge_remote(self, remote_text: str) -> int:
+        # Three-way merge a remote version into the local edits, returns the number of conflicts (marked in the text)
+        local_text = self.note_edit_widget.toPlainText()
+        remote_text = normalize_text(remote_text)
+        edits, conflicts = merge3(self.base_text, local_text, remote_text)
+        self.base_text = remote_text
+        self.replace_ranges(local_text, edits)
+        logger.debug(f"NoteTabEntryWidget.merge_remote: {len(edits)} hunks merged into {self.note.uid}, {conflicts} conflicts.")
+        return conflicts
+
+    def update_text(self, text: str):
+        # Replace the unmodified text with a new version, the text equals the base
+        text = normalize_text(text)
+        edits = diff_edits(self.base_text, text)
+        self.replace_ranges(self.base_text, edits)
+        self.base_text = text
+        self.set_modified(False)
+        logger.debug(f"NoteTabEntryWidget.update_text: {len(edits)} hunks updated in {self.note.uid}.")
+
+    def replace_ranges(self, text: str, edits: List[Tuple[int, int, str]]):
+        # Apply edits to the editor which contains text. Only the changed ranges are replaced, in one undo step,
+        # so the layout of the rest, the text cursor and the scroll position stay put.
+        positions, offset, previous = [], 0, 0
+        for start, end, replacement in edits:
+            offset += utf16_length(text[previous:start])
+            positions.append((offset, offset + utf16_length(text[start:end]), replacement))
+            previous = start
+
+        text_cursor = QtGui.QTextCursor(self.note_edit_widget.document())
+        text_cursor.beginEditBlock()
+        for start, end, replacement in reversed(positions):
+            text_cursor.setPosition(start)
+            text_cursor.setPosition(end, QtGui.QTextCursor.KeepAnchor)
+            text_cursor.insertText(replacement)
+        text_cursor.endEditBlock()
+
+    def set_modified(self, modified: bool = True):
+        self.note_edit_widget.document().setModified(modified)
+
     def note_edit_changed_callback(self):
         if self.update_preview:
-            self.note_preview_widget.setMarkdown(self.note_edit_widget.toPlainText())
-        self.note.changed = True
-        self.mainwindow.pb_save.setEnabled(True)
-        self.mainwindow.actionSave.setEnabled(True)
+            self.note_preview_widget.render_later(self.note_edit_widget.toPlainText)
+        if self.is_modified():
+            self.mainwindow.autosave_scheduler.edited()
+
+    def modification_changed_callback(self, modified: bool):
+        if self.mainwindow.notes_tab_widget.currentWidget() is self:
+            self.mainwindow.pb_save.setEnabled(self.is_dirty())
+            self.mainwindow.actionSave.setEnabled(self.is_dirty())
 
     def link_callbacks(self):
         self.note_edit_widget.textChanged.connect(self.note_edit_changed_callback)
+        self.note_edit_widget.document().modificationChanged.connect(self.modification_changed_callback)
         self.splitter.splitterMoved.connect(lambda _: settings.setValue(f"noteentrywidget/{self.note.notebook.uid}/{self.note.uid}/splitter", self.splitter.saveState()))
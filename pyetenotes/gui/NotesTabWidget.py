@@ -56,13 +56,17 @@ class NotesTabWidget(QtWidgets.QTabWidget):
         return [self.widget(index) for index in range(self.count())]
 
     def note_is_opened(self, note: Note) -> int:
-        note_widget_opened = list(filter(lambda nw: nw.note.uid == note.uid, self.opened_note_widgets()))
+        return self.find_tab(note.uid)
+
+    def find_tab(self, uid: str) -> int:
+        note_widget_opened = list(filter(lambda nw: nw.note.uid == uid, self.opened_note_widgets()))
         return self.indexOf(note_widget_opened[0]) if note_widget_opened else -1
 
     def close_tab(self, index):
         self.mainwindow.save_note()
         widget: NoteTabEntryWidget = self.widget(index)
         if widget is not None:
+            widget.note_preview_widget.discard()
             self.tab_closed.emit(widget.note)
             widget.deleteLater()
         self.removeTab(index)
@@ -79,13 +83,16 @@ class NotesTabWidget(QtWidgets.QTabWidget):
             if (index := self.note_is_opened(note)) >= 0:
                 widget: NoteTabEntryWidget = self.widget(index)
 
-                if note.content == widget.note.content and note.name == widget.note.name:
+                if note.item.etag == widget.note.item.etag and note.name == widget.note.name:
                     continue
-                elif not widget.note.changed:
-                    widget.note_edit_widget.setText(note.content.decode())
+                elif not widget.is_dirty():
+                    widget.update_text(note.content.decode())
                     logger.debug(f"NotesTabWidget.update_notes: note {widget.note.name} - {widget.note.uid} updated.")
                 else:
-                    note.changed = True
+                    # Merge the new version into the local edits, which are saved over it
+                    if conflicts := widget.merge_remote(note.content.decode()):
+                        self.mainwindow.statusbar.showMessage(f"{note.name}: {conflicts} conflicting change{'s' if conflicts > 1 else ''} marked in the text.", 10000)
+                    widget.set_modified(True)
 
                 widget.note = note
                 self.setTabText(index, note.name)
@@ -94,8 +101,8 @@ class NotesTabWidget(QtWidgets.QTabWidget):
         if index < 0:
             return
         current_note_widget: NoteTabEntryWidget = self.currentWidget()
-        self.mainwindow.pb_save.setEnabled(current_note_widget.note.changed)
-        self.mainwindow.actionSave.setEnabled(current_note_widget.note.changed)
+        self.mainwindow.pb_save.setEnabled(current_note_widget.is_dirty())
+        self.mainwindow.actionSave.setEnabled(current_note_widget.is_dirty())
         self.mainwindow.combo_view.setCurrentText(current_note_widget.view)
 
     def link_callbacks(self):
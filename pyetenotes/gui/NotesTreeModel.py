@@ -0,0 +1,345 @@
+import bisect
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from PyQt5 import QtCore, QtGui
+
+from ..__version__ import __title__
+from ..etesync import Note, Notebook
+from ..settings import Settings
+
+
+logger = logging.getLogger("logger")
+settings = Settings(__title__)
+
+
+class NotebookRecord(object):
+    __slots__ = ("uid", "name", "notebook", "children", "fetched", "row")
+
+    def __init__(self, notebook: Notebook):
+        self.uid = notebook.uid
+        self.name = notebook.name
+        self.notebook = notebook
+        self.children: List[NoteRecord] = []
+        self.fetched = 0  # Number of children exposed to the views
+        self.row = 0
+
+    def __lt__(self, other: "NotebookRecord") -> bool:
+        return (self.name.lower(), self.uid) < (other.name.lower(), other.uid)
+
+
+class NoteRecord(object):
+    # The note itself (its item and contents) is loaded from the cache when it is opened or exported
+    __slots__ = ("uid", "name", "notebook_uid", "parent", "opened")
+
+    def __init__(self, note: Note, parent: NotebookRecord):
+        self.uid = note.uid
+        self.name = note.name
+        self.notebook_uid = parent.uid
+        self.parent = parent
+        self.opened = False
+
+    def __lt__(self, other: "NoteRecord") -> bool:
+        return (self.name.lower(), self.uid) < (other.name.lower(), other.uid)
+
+
+Record = Union[NotebookRecord, NoteRecord]
+
+
+class NotesTreeModel(QtCore.QAbstractItemModel):
+    def __init__(self, parent: QtCore.QObject = None):
+        super(NotesTreeModel, self).__init__(parent)
+        self.notebooks: List[NotebookRecord] = []
+        # uid -> record
+        self.notebook_records: Dict[str, NotebookRecord] = {}
+        self.note_records: Dict[str, NoteRecord] = {}
+        self.fetch_size = settings.value("notestreewidget/fetchsize", type=int)
+        self.opened_icon = self.create_opened_icon()
+
+    @staticmethod
+    def create_opened_icon() -> QtGui.QIcon:
+        # Indicator for notes that are opened in a tab
+        pixmap = QtGui.QPixmap(7, 7)
+        pixmap.fill(QtGui.QColor("lightblue"))
+        return QtGui.QIcon(pixmap)
+
+    # Qt model interface
+
+    def index(self, row: int, column: int, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> QtCore.QModelIndex:
+        if column != 0 or row < 0:
+            return QtCore.QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, 0, self.notebooks[row]) if row < len(self.notebooks) else QtCore.QModelIndex()
+        record = parent.internalPointer()
+        if isinstance(record, NotebookRecord) and row < record.fetched:
+            return self.createIndex(row, 0, record.children[row])
+        return QtCore.QModelIndex()
+
+    def parent(self, index: QtCore.QModelIndex) -> QtCore.QModelIndex:
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        record = index.internalPointer()
+        if isinstance(record, NoteRecord):
+            return self.createIndex(record.parent.row, 0, record.parent)
+        return QtCore.QModelIndex()
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        if not parent.isValid():
+            return len(self.notebooks)
+        record = parent.internalPointer()
+        return record.fetched if isinstance(record, NotebookRecord) else 0
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 1
+
+    def hasChildren(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> bool:
+        if not parent.isValid():
+            return bool(self.notebooks)
+        record = parent.internalPointer()
+        return isinstance(record, NotebookRecord) and bool(record.children)
+
+    def canFetchMore(self, parent: QtCore.QModelIndex) -> bool:
+        if not parent.isValid():
+            return False
+        record = parent.internalPointer()
+        return isinstance(record, NotebookRecord) and record.fetched < len(record.children)
+
+    def fetchMore(self, parent: QtCore.QModelIndex):
+        if not self.canFetchMore(parent):
+            return
+        record: NotebookRecord = parent.internalPointer()
+        count = min(len(record.children), record.fetched + self.fetch_size) - record.fetched
+        self.beginInsertRows(parent, record.fetched, record.fetched + count - 1)
+        record.fetched += count
+        self.endInsertRows()
+
+    def flags(self, index: QtCore.QModelIndex) -> QtCore.Qt.ItemFlags:
+        return QtCore.Qt.ItemIsEnabled if index.isValid() else QtCore.Qt.NoItemFlags
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        record: Record = index.internalPointer()
+        if role == QtCore.Qt.DisplayRole:
+            return record.name
+        elif role == QtCore.Qt.UserRole:
+            return record
+        elif isinstance(record, NoteRecord):
+            if role == QtCore.Qt.DecorationRole and record.opened:
+                return self.opened_icon
+            elif role == QtCore.Qt.SizeHintRole:
+                return QtCore.QSize(0, 22)
+        else:
+            if role == QtCore.Qt.BackgroundRole:
+                return self.notebook_background(record.notebook)
+            elif role == QtCore.Qt.ToolTipRole:
+                return record.notebook.collection.meta.get("description")
+            elif role == QtCore.Qt.SizeHintRole:
+                return QtCore.QSize(0, 25)
+        return None
+
+    @staticmethod
+    def notebook_background(notebook: Notebook) -> Optional[QtGui.QColor]:
+        if settings.value("notestreewidget/showcolors", type=bool) and notebook.color:
+            color = QtGui.QColor(notebook.color)
+            return QtGui.QColor(color.red(), color.green(), color.blue(), alpha=settings.value("notestreewidget/color/alpha", type=int))
+        return None
+
+    # Record helpers
+
+    def record_index(self, record: Record) -> QtCore.QModelIndex:
+        if isinstance(record, NotebookRecord):
+            return self.createIndex(record.row, 0, record)
+        row = self.child_row(record)
+        if row < 0 or row >= record.parent.fetched:
+            return QtCore.QModelIndex()
+        return self.createIndex(row, 0, record)
+
+    @staticmethod
+    def child_row(record: NoteRecord) -> int:
+        children = record.parent.children
+        row = bisect.bisect_left(children, record)
+        return row if row < len(children) and children[row] is record else -1
+
+    def renumber_notebooks(self):
+        for row, record in enumerate(self.notebooks):
+            record.row = row
+
+    def fetch_all(self):
+        for record in self.notebooks:
+            while self.canFetchMore(index := self.record_index(record)):
+                self.fetchMore(index)
+
+    # Mutations
+
+    def reset(self, notebooks: Iterable[Notebook], notes: Iterable[Note]):
+        # Bulk (re)population: group the notes per notebook and sort every notebook once
+        self.beginResetModel()
+        self.notebook_records = {notebook.uid: NotebookRecord(notebook) for notebook in notebooks}
+        self.note_records = {}
+        for note in notes:
+            if (parent := self.notebook_records.get(note.notebook.uid)) is None:
+                logger.error(f"NotesTreeModel.reset: {note.notebook.name} not found when adding {note.name}.")
+                continue
+            record = self.note_records[note.uid] = NoteRecord(note, parent)
+            parent.children.append(record)
+        for parent in self.notebook_records.values():
+            parent.children.sort()
+        self.notebooks = sorted(self.notebook_records.values())
+        self.renumber_notebooks()
+        self.endResetModel()
+
+    def add_notebook(self, notebook: Notebook) -> NotebookRecord:
+        record = self.notebook_records[notebook.uid] = NotebookRecord(notebook)
+        row = bisect.bisect_left(self.notebooks, record)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.notebooks.insert(row, record)
+        self.renumber_notebooks()
+        self.endInsertRows()
+        return record
+
+    def add_notes(self, notes: Iterable[Note], bulk: bool = False):
+        # bulk: large batches (restoring the cache) are inserted per notebook in one go
+        children: Dict[str, List[NoteRecord]] = {}
+        for note in notes:
+            if (parent := self.notebook_records.get(note.notebook.uid)) is None:
+                logger.error(f"NotesTreeModel.add_notes: {note.notebook.name} not found when adding {note.name}.")
+                continue
+            record = self.note_records[note.uid] = NoteRecord(note, parent)
+            children.setdefault(parent.uid, []).append(record)
+
+        for notebook_uid, records in children.items():
+            parent = self.notebook_records[notebook_uid]
+            if bulk or parent.fetched == 0 or len(records) > self.fetch_size:
+                self.insert_children_bulk(parent, records)
+            else:
+                for record in records:
+                    self.insert_child(parent, record)
+
+    def insert_child(self, parent: NotebookRecord, record: NoteRecord):
+        row = bisect.bisect_left(parent.children, record)
+        if row > parent.fetched:
+            # Not exposed to the views yet, will be fetched on demand
+            parent.children.insert(row, record)
+            return
+        self.beginInsertRows(self.record_index(parent), row, row)
+        parent.children.insert(row, record)
+        parent.fetched += 1
+        self.endInsertRows()
+
+    def insert_children_bulk(self, parent: NotebookRecord, records: List[NoteRecord]):
+        # Expose the new rows in one go instead of one insert per record
+        parent_index = self.record_index(parent)
+        had_children = bool(parent.children)
+        fetched = parent.fetched
+        if fetched:
+            self.beginRemoveRows(parent_index, 0, fetched - 1)
+            parent.fetched = 0
+            self.endRemoveRows()
+        parent.children.extend(records)
+        parent.children.sort()
+        if fetched or not had_children:
+            count = min(len(parent.children), max(fetched, self.fetch_size))
+            self.beginInsertRows(parent_index, 0, count - 1)
+            parent.fetched = count
+            self.endInsertRows()
+
+    def update_notebook(self, notebook: Notebook):
+        if (record := self.notebook_records.get(notebook.uid)) is None:
+            return
+        record.notebook = notebook
+        if record.name != notebook.name:
+            # Renamed: move the record to its new sorted position
+            old_row = record.row
+            notebooks = self.notebooks[:old_row] + self.notebooks[old_row + 1:]
+            record.name = notebook.name
+            new_row = bisect.bisect_left(notebooks, record)
+            if new_row != old_row:
+                self.beginMoveRows(QtCore.QModelIndex(), old_row, old_row, QtCore.QModelIndex(), new_row + 1 if new_row > old_row else new_row)
+                notebooks.insert(new_row, record)
+                self.notebooks = notebooks
+                self.renumber_notebooks()
+                self.endMoveRows()
+        index = self.record_index(record)
+        self.dataChanged.emit(index, index)
+
+    def update_note(self, note: Note):
+        if (record := self.note_records.get(note.uid)) is None:
+            return
+        if record.name == note.name:
+            if (index := self.record_index(record)).isValid():
+                self.dataChanged.emit(index, index)
+            return
+        # Renamed: move the record to its new sorted position
+        opened = record.opened
+        self.remove_note(note.uid)
+        record = self.note_records[note.uid] = NoteRecord(note, record.parent)
+        record.opened = opened
+        self.insert_child(record.parent, record)
+
+    def remove_note(self, uid: str) -> Optional[NoteRecord]:
+        if (record := self.note_records.pop(uid, None)) is None:
+            return None
+        parent = record.parent
+        if (row := self.child_row(record)) < 0:
+            return record
+        if row < parent.fetched:
+            self.beginRemoveRows(self.record_index(parent), row, row)
+            parent.children.pop(row)
+            parent.fetched -= 1
+            self.endRemoveRows()
+        else:
+            parent.children.pop(row)
+        return record
+
+    def remove_notebook(self, uid: str) -> Optional[NotebookRecord]:
+        if (record := self.notebook_records.pop(uid, None)) is None:
+            return None
+        for child in record.children:
+            self.note_records.pop(child.uid, None)
+        self.beginRemoveRows(QtCore.QModelIndex(), record.row, record.row)
+        self.notebooks.pop(record.row)
+        self.renumber_notebooks()
+        self.endRemoveRows()
+        return record
+
+    def set_opened(self, uid: str, opened: bool):
+        if (record := self.note_records.get(uid)) is None:
+            return
+        record.opened = opened
+        if (index := self.record_index(record)).isValid():
+            self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+
+class NotesFilterProxyModel(QtCore.QSortFilterProxyModel):
+    def __init__(self, parent: QtCore.QObject = None):
+        super(NotesFilterProxyModel, self).__init__(parent)
+        self.filter_text = ""
+        self.ranks: Dict[str, float] = {}  # uid -> search score
+
+    def set_filter(self, text: str, ranks: Dict[str, float] = None):
+        self.filter_text = text.lower().strip()
+        self.ranks = ranks or {}
+        if self.filter_text:
+            # Rows that are not fetched yet can not be filtered
+            self.sourceModel().fetch_all()
+        self.invalidateFilter()
+        # Best matches first while filtering, the (sorted) source order otherwise
+        self.sort(0 if self.filter_text else -1)
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QtCore.QModelIndex) -> bool:
+        # Notebooks are always shown, notes when the filter text appears in their name or matches their contents
+        if not source_parent.isValid() or not self.filter_text:
+            return True
+        record: NoteRecord = self.sourceModel().index(source_row, 0, source_parent).internalPointer()
+        return record.uid in self.ranks or self.filter_text in record.name.lower()
+
+    def lessThan(self, left: QtCore.QModelIndex, right: QtCore.QModelIndex) -> bool:
+        left_record: Record = left.internalPointer()
+        right_record: Record = right.internalPointer()
+        if isinstance(left_record, NoteRecord) and isinstance(right_record, NoteRecord):
+            left_rank = self.ranks.get(left_record.uid, 0.0)
+            right_rank = self.ranks.get(right_record.uid, 0.0)
+            if left_rank != right_rank:
+                return left_rank > right_rank
+        return left.row() < right.row()
@@ -1,15 +1,18 @@
 import logging
 import os
+import weakref
 from enum import Enum
-from typing import Iterator, List, Optional, Union
-from PyQt5 import QtCore, QtGui, QtWidgets
+from typing import Iterable, Iterator, List, Optional, Union
+from PyQt5 import QtCore, QtWidgets
 
 from ..__version__ import __title__
 from ..etesync import EtesyncNotes, Note, Notebook
 from ..settings import Settings
-from ..tasks import DeleteNotebookTask, DeleteNoteTask, ExportNoteTask, ExportNotesTask
+from ..search import SearchIndex
+from ..tasks import DeleteNotebookTask, DeleteNoteTask, ExportNoteTask, ExportNotesTask, IndexNotesThread
 from ..utils import get_clean_string
 from .FilterNotesWidget import FilterNotesWidget
+from .NotesTreeModel import NotebookRecord, NoteRecord, NotesFilterProxyModel, NotesTreeModel
 
 
 logger = logging.getLogger("logger")
@@ -41,97 +44,44 @@ class NotebookTreeWidgetItemContextMenu(QtWidgets.QMenu):
         self.action_delete = self.addAction("Delete notebook")
 
 
-class NotebookTreeWidgetItem(QtWidgets.QTreeWidgetItem):
-    def __init__(self, notebook: Notebook, mainwindow: QtWidgets.QMainWindow):
-        super(NotebookTreeWidgetItem, self).__init__([notebook.name])
-        self.notebook = notebook
-        self.mainwindow = mainwindow
-        self.set_color(notebook.color)
-        self.setSizeHint(0, QtCore.QSize(0, 25))
-        self.setToolTip(0, notebook.collection.meta.get("description"))
-
-    def set_color(self, color: str):
-        if settings.value("notestreewidget/showcolors", type=bool) and color:
-            color = QtGui.QColor(color)
-            self.setBackground(0, QtGui.QColor(color.red(), color.green(), color.blue(), alpha=settings.value("notestreewidget/color/alpha", type=int)))
-
-    def context_callback(self, pos: QtCore.QPoint) -> NoteContextAction:
-        context_menu = NotebookTreeWidgetItemContextMenu()
-        action = context_menu.exec_(pos)
-        if action == context_menu.action_delete:
-            response = QtWidgets.QMessageBox.warning(
-                self.mainwindow,
-                "Are you sure?",
-                f"Delete notebook \"{self.notebook.name}\"?",
-                QtWidgets.QMessageBox.Ok | QtWidgets.QMessageBox.Cancel,
-                defaultButton=QtWidgets.QMessageBox.Cancel
-            )
-            if response == QtWidgets.QMessageBox.Ok:
-                return NoteContextAction.Delete
-        elif action == context_menu.action_create_note:
-            self.mainwindow.new_note_callback(self.notebook)
-            return NoteContextAction.Nop
-        elif action == context_menu.action_export:
-            return NoteContextAction.Export
-        else:
-            return NoteContextAction.Nop
-
-
-class NoteTreeWidgetItem(QtWidgets.QTreeWidgetItem):
-    def __init__(self, note: Note, parent: NotebookTreeWidgetItem, mainwindow: QtWidgets.QMainWindow):
-        super(NoteTreeWidgetItem, self).__init__([note.name])
-        self.note = note
-        self.parent = parent
-        self.mainwindow = mainwindow
-        self.setSizeHint(0, QtCore.QSize(0, 22))
-
-    def context_callback(self, pos: QtCore.QPoint) -> NoteContextAction:
-        context_menu = NoteTreeWidgetItemContextMenu()
-        action = context_menu.exec_(pos)
-        if action == context_menu.action_delete:
-            response = QtWidgets.QMessageBox.warning(
-                self.mainwindow,
-                "Are you sure?",
-                f"Delete note \"{self.note.name}\"?",
-                QtWidgets.QMessageBox.Ok | QtWidgets.QMessageBox.Cancel,
-                defaultButton=QtWidgets.QMessageBox.Cancel
-            )
-            if response == QtWidgets.QMessageBox.Ok:
-                return NoteContextAction.Delete
-        elif action == context_menu.action_export:
-            return NoteContextAction.Export
-
-        return NoteContextAction.Nop
-
-
 class NotesTreeWidget(QtWidgets.QWidget):
     def __init__(self, mainwindow: QtWidgets.QMainWindow):
         super(NotesTreeWidget, self).__init__(mainwindow)
         self.mainwindow = mainwindow
         self.api: EtesyncNotes = mainwindow.api
-        self.notes_tree_widget = QtWidgets.QTreeWidget()
+        self.notes_tree_model = NotesTreeModel(self)
+        self.notes_proxy_model = NotesFilterProxyModel(self)
+        self.notes_proxy_model.setSourceModel(self.notes_tree_model)
+        self.notes_tree_view = QtWidgets.QTreeView()
         self.filter_notes_widget = FilterNotesWidget()
+        self.search_index = SearchIndex()
+        # Notes that are in use elsewhere (a tab, a queued save) are handed out again instead of reloaded from the cache
+        self.loaded_notes = weakref.WeakValueDictionary()
+        self.index_notes_thread = IndexNotesThread(self.api, self.search_index)
         self.init_ui()
+        self.index_notes_thread.start()
 
     def init_ui(self):
         self.gridLayout = QtWidgets.QGridLayout(self)
         self.verticalLayout = QtWidgets.QVBoxLayout()
 
         self.verticalLayout.addWidget(self.filter_notes_widget)
-        self.verticalLayout.addWidget(self.notes_tree_widget)
+        self.verticalLayout.addWidget(self.notes_tree_view)
         self.gridLayout.addLayout(self.verticalLayout, 0, 0, 1, 1)
         self.gridLayout.setContentsMargins(1, 1, 1, 1)
 
-        self.notes_tree_widget.setIndentation(10)
-        self.notes_tree_widget.setColumnCount(1)
-        self.notes_tree_widget.setHeaderHidden(True)
-        self.notes_tree_widget.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
-        self.notes_tree_widget.setAlternatingRowColors(False)
+        self.notes_tree_view.setModel(self.notes_proxy_model)
+        self.notes_tree_view.setIndentation(10)
+        self.notes_tree_view.setHeaderHidden(True)
+        self.notes_tree_view.setUniformRowHeights(True)
+        self.notes_tree_view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.notes_tree_view.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        self.notes_tree_view.setAlternatingRowColors(False)
         size_policy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Preferred, QtWidgets.QSizePolicy.Minimum)
         size_policy.setHorizontalStretch(0)
         size_policy.setVerticalStretch(0)
-        self.notes_tree_widget.setSizePolicy(size_policy)
-        self.notes_tree_widget.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.notes_tree_view.setSizePolicy(size_policy)
+        self.notes_tree_view.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
 
         # self.build_tree()
 
@@ -141,183 +91,251 @@ class NotesTreeWidget(QtWidgets.QWidget):
         self.filter_notes_widget.toggle()
 
     def build_tree(self):
-        for notebook in self.api.get_notebooks():
-            self.notes_tree_widget.add_notebook(notebook)
+        for notebook in self.api.iter_notebooks():
+            self.add_notebook(notebook, self.api.iter_notes(notebook))
 
-    def restore(self, notebooks: List[Notebook], notes: List[Note]):
+    def restore(self, notebooks: List[Notebook], notes: Iterable[Note]):
+        notes = list(notes)
+        self.notes_tree_model.reset(notebooks, notes)
         for notebook in notebooks:
-            twi_notebook = NotebookTreeWidgetItem(notebook, self.mainwindow)
-            self.notes_tree_widget.addTopLevelItem(twi_notebook)
-            twi_notebook.setExpanded(settings.value(f"notetreewidget/{notebook.uid}/expanded", True, type=bool))
-
-        for note in notes:
-            self.add_note(note, note.notebook)
-
-    def add_notebook(self, notebook: Notebook):
-        twi_notebook = NotebookTreeWidgetItem(notebook, self.mainwindow)
-        for note in self.api.get_notes(notebook):
-            twi_notebook.addChild(NoteTreeWidgetItem(note, twi_notebook, self.mainwindow))
-        self.notes_tree_widget.addTopLevelItem(twi_notebook)
-        twi_notebook.setExpanded(settings.value(f"notetreewidget/{notebook.uid}/expanded", True, type=bool))
-        twi_notebook.sortChildren(0, QtCore.Qt.AscendingOrder)
-        self.notes_tree_widget.sortItems(0, QtCore.Qt.AscendingOrder)
+            self.restore_expanded(notebook)
+        self.index_notes(note.uid for note in notes)
+
+    def restore_expanded(self, notebook: Notebook):
+        if record := self.notes_tree_model.notebook_records.get(notebook.uid):
+            index = self.notes_proxy_model.mapFromSource(self.notes_tree_model.record_index(record))
+            self.notes_tree_view.setExpanded(index, settings.value(f"notetreewidget/{notebook.uid}/expanded", True, type=bool))
+
+    def add_notebook(self, notebook: Notebook, notes: Iterable[Note] = ()):
+        # The notes of a synced notebook are delivered page by page through the update signal
+        notes = list(notes)
+        self.notes_tree_model.add_notebook(notebook)
+        self.notes_tree_model.add_notes(notes)
+        self.restore_expanded(notebook)
+        self.index_notes(note.uid for note in notes)
 
     def add_note(self, note: Note, notebook: Notebook):
-        items: List[NotebookTreeWidgetItem] = self.notes_tree_widget.findItems(notebook.name, QtCore.Qt.MatchExactly, 0)
-        if items:
-            twi_notebook = items[0]
-            twi_notebook.addChild(NoteTreeWidgetItem(note, twi_notebook, self.mainwindow))
-            twi_notebook.sortChildren(0, QtCore.Qt.AscendingOrder)
+        if notebook.uid in self.notes_tree_model.notebook_records:
+            self.notes_tree_model.add_notes([note])
+            self.index_notes([note.uid])
         else:
             logger.error(f"NotesTreeWidget:add_note {notebook.name} not found when adding {note.name}.")
 
+    def add_notes(self, notes: Iterable[Note], bulk: bool = False):
+        notes = list(notes)
+        self.notes_tree_model.add_notes(notes, bulk)
+        self.index_notes(note.uid for note in notes)
+
+    def index_notes(self, uids: Iterable[str]):
+        # (Re)index the titles and contents of the cached notes in the background
+        self.index_notes_thread.add(uids)
+
     def update_notebooks(self, notebooks: List[Notebook]):
         for notebook in notebooks:
-            if notebook_tree_item := self.find_notebook_tree_item(notebook):
-                notebook_tree_item.notebook = notebook
-                notebook_tree_item.setText(0, notebook.name)
-                notebook_tree_item.set_color(notebook.color)
-                notebook_tree_item.setToolTip(0, notebook.collection.meta.get("description"))
-                logger.debug(f"NotesTreeWidget.update_notebooks: updated {notebook.name} - {notebook.uid}")
+            self.notes_tree_model.update_notebook(notebook)
+            logger.debug(f"NotesTreeWidget.update_notebooks: updated {notebook.name} - {notebook.uid}")
 
     def update_notes(self, notes: List[Note]):
         for note in notes:
-            if note_tree_item := self.find_note_tree_item(note):
-                note_tree_item.note = note
-                note_tree_item.setText(0, note.name)
-                logger.debug(f"NotesTreeWidget.update_notes: updated {note.name} - {note.uid}")
+            self.notes_tree_model.update_note(note)
+            self.loaded_notes.pop(note.uid, None)
+            logger.debug(f"NotesTreeWidget.update_notes: updated {note.name} - {note.uid}")
+        self.index_notes(note.uid for note in notes)
+
+    def remove_notebooks(self, uids: Iterable[str]):
+        for uid in uids:
+            if (record := self.notes_tree_model.notebook_records.get(uid)) is None:
+                continue
+            self.remove_notes([child.uid for child in record.children])
+            self.notes_tree_model.remove_notebook(uid)
+            logger.debug(f"NotesTreeWidget.remove_notebooks: removed {record.name} - {record.uid}")
+
+    def remove_notes(self, uids: Iterable[str]):
+        for uid in uids:
+            if (record := self.notes_tree_model.remove_note(uid)) is None:
+                continue
+            self.search_index.remove(uid)
+            self.loaded_notes.pop(uid, None)
+            if (index := self.mainwindow.notes_tab_widget.find_tab(uid)) >= 0:
+                self.mainwindow.notes_tab_widget.close_tab(index)
+            logger.debug(f"NotesTreeWidget.remove_notes: removed {record.name} - {record.uid}")
 
     def find_notebooks(self) -> List[Notebook]:
-        return [self.notes_tree_widget.topLevelItem(index).notebook for index in range(self.notes_tree_widget.topLevelItemCount())]
+        return [record.notebook for record in self.notes_tree_model.notebooks]
 
     def find_notebook(self, name: str) -> Notebook:
-        items: List[NotebookTreeWidgetItem] = self.notes_tree_widget.findItems(name, QtCore.Qt.MatchExactly, 0)
-        return items[0].notebook if items and isinstance(items[0], NotebookTreeWidgetItem) else None
+        for record in self.notes_tree_model.notebooks:
+            if record.name == name:
+                return record.notebook
+        return None
 
-    def find_notes(self) -> List[Note]:
-        return [item.note for item in self.notes_tree_widget.findItems("*", QtCore.Qt.MatchWildcard | QtCore.Qt.MatchRecursive) if isinstance(item, NoteTreeWidgetItem)]
+    def find_note_uids(self) -> List[str]:
+        return list(self.notes_tree_model.note_records)
 
-    def find_note_widget_items(self) -> Iterator[NoteTreeWidgetItem]:
-        return filter(lambda item: isinstance(item, NoteTreeWidgetItem), self.notes_tree_widget.findItems("*", QtCore.Qt.MatchWildcard | QtCore.Qt.MatchRecursive))
+    def find_note_records(self) -> Iterator[NoteRecord]:
+        return iter(self.notes_tree_model.note_records.values())
 
-    def find_notes_in_notebook(self, notebook: Notebook) -> List[Note]:
-        return list(filter(lambda note: note.notebook.uid == notebook.uid, self.find_notes()))
+    def find_note_uids_in_notebook(self, notebook: Notebook) -> List[str]:
+        if (record := self.notes_tree_model.notebook_records.get(notebook.uid)) is None:
+            return []
+        return [child.uid for child in record.children]
 
-    def find_notebook_tree_item(self, notebook: Notebook) -> Optional[NotebookTreeWidgetItem]:
-        for index in range(self.notes_tree_widget.topLevelItemCount()):
-            item: NotebookTreeWidgetItem = self.notes_tree_widget.topLevelItem(index)
-            if item.notebook.uid == notebook.uid:
-                return item
-        return None
+    def find_notebook_record(self, notebook: Notebook) -> Optional[NotebookRecord]:
+        return self.notes_tree_model.notebook_records.get(notebook.uid)
 
-    def find_note_tree_item(self, note: Note) -> Optional[NoteTreeWidgetItem]:
-        for item in self.notes_tree_widget.findItems("*", QtCore.Qt.MatchWildcard | QtCore.Qt.MatchRecursive):
-            if isinstance(item, NoteTreeWidgetItem) and item.note.uid == note.uid:
-                return item
-        return None
+    def find_note_record(self, note: Note) -> Optional[NoteRecord]:
+        return self.notes_tree_model.note_records.get(note.uid)
+
+    def load_note(self, record: NoteRecord) -> Optional[Note]:
+        if (note := self.loaded_notes.get(record.uid)) is None:
+            if (note := self.api.get_cached_note(record.uid, record.parent.notebook)) is None:
+                logger.error(f"NotesTreeWidget.load_note: {record.name} - {record.uid} not found in the cache.")
+                return None
+            self.loaded_notes[record.uid] = note
+        return note
+
+    def record_at(self, index: QtCore.QModelIndex) -> Optional[Union[NotebookRecord, NoteRecord]]:
+        if not index.isValid():
+            return None
+        return self.notes_proxy_model.mapToSource(index).internalPointer()
 
-    def item_clicked_callback(self, item: NoteTreeWidgetItem, column: int):
-        if not isinstance(item, NoteTreeWidgetItem):
+    def item_clicked_callback(self, index: QtCore.QModelIndex):
+        record = self.record_at(index)
+        if not isinstance(record, NoteRecord):
+            return
+
+        if (index := self.mainwindow.notes_tab_widget.find_tab(record.uid)) >= 0:
+            self.mainwindow.notes_tab_widget.select_tab(index)
+            return
+        if (note := self.load_note(record)) is None:
             return
 
         # Add an indicator when the note is opened in a tab
-        pixmap = QtGui.QPixmap(7, 7)
-        color = QtGui.QColor("lightblue")
-        pixmap.fill(color)
-        item.setIcon(0, QtGui.QIcon(pixmap))
+        self.notes_tree_model.set_opened(record.uid, True)
 
-        self.mainwindow.open_note(item.note.name, item.note)
+        self.mainwindow.open_note(note.name, note)
 
     def close_note(self, note: Note):
         # Remove the "open" icon indicator
-        for note_widget in self.find_note_widget_items():
-            if note_widget.note.uid == note.uid:
-                note_widget.setIcon(0, QtGui.QIcon())
-                return
+        self.notes_tree_model.set_opened(note.uid, False)
+
+    def notebook_context_callback(self, record: NotebookRecord, pos: QtCore.QPoint) -> NoteContextAction:
+        context_menu = NotebookTreeWidgetItemContextMenu()
+        action = context_menu.exec_(pos)
+        if action == context_menu.action_delete:
+            response = QtWidgets.QMessageBox.warning(
+                self.mainwindow,
+                "Are you sure?",
+                f"Delete notebook \"{record.notebook.name}\"?",
+                QtWidgets.QMessageBox.Ok | QtWidgets.QMessageBox.Cancel,
+                defaultButton=QtWidgets.QMessageBox.Cancel
+            )
+            if response == QtWidgets.QMessageBox.Ok:
+                return NoteContextAction.Delete
+        elif action == context_menu.action_create_note:
+            self.mainwindow.new_note_callback(record.notebook)
+        elif action == context_menu.action_export:
+            return NoteContextAction.Export
+
+        return NoteContextAction.Nop
+
+    def note_context_callback(self, record: NoteRecord, pos: QtCore.QPoint) -> NoteContextAction:
+        context_menu = NoteTreeWidgetItemContextMenu()
+        action = context_menu.exec_(pos)
+        if action == context_menu.action_delete:
+            response = QtWidgets.QMessageBox.warning(
+                self.mainwindow,
+                "Are you sure?",
+                f"Delete note \"{record.name}\"?",
+                QtWidgets.QMessageBox.Ok | QtWidgets.QMessageBox.Cancel,
+                defaultButton=QtWidgets.QMessageBox.Cancel
+            )
+            if response == QtWidgets.QMessageBox.Ok:
+                return NoteContextAction.Delete
+        elif action == context_menu.action_export:
+            return NoteContextAction.Export
+
+        return NoteContextAction.Nop
 
     def context_callback(self, pos: QtCore.QPoint):
-        item: Union[NotebookTreeWidgetItem, NoteTreeWidgetItem, QtWidgets.QTreeWidgetItem] = self.notes_tree_widget.itemAt(pos)
-        if item is None:
+        record = self.record_at(self.notes_tree_view.indexAt(pos))
+        if record is None:
             return
-        pos_mapped = self.notes_tree_widget.mapToGlobal(pos)
-        action = item.context_callback(pos_mapped)
+        pos_mapped = self.notes_tree_view.viewport().mapToGlobal(pos)
+        if isinstance(record, NoteRecord):
+            action = self.note_context_callback(record, pos_mapped)
+        else:
+            action = self.notebook_context_callback(record, pos_mapped)
 
         if action == NoteContextAction.Nop:
             return
         elif action == NoteContextAction.Delete:
-            if isinstance(item, NoteTreeWidgetItem):
+            if isinstance(record, NoteRecord):
                 # Remove via the api
-                self.delete_note_task = DeleteNoteTask(self.api, item.note)
-                self.delete_note_task.start()
+                if (note := self.load_note(record)) is not None:
+                    self.mainwindow.task_executor.submit(DeleteNoteTask(self.api, note))
 
                 # Remove settings
-                settings.remove(f"notewidget/{item.note.notebook.uid}/{item.note.uid}/")
+                settings.remove(f"notewidget/{record.notebook_uid}/{record.uid}/")
 
-                # Check if the note is opened in a tab
-                if (index := self.mainwindow.notes_tab_widget.note_is_opened(item.note)) is not None:
-                    self.mainwindow.notes_tab_widget.close_tab(index)
+                # Remove from the tree, and its tab when the note is opened
+                self.remove_notes([record.uid])
 
-                # Remove from the tree
-                twi_notebook: NotebookTreeWidgetItem = item.parent
-                twi_notebook.takeChild(twi_notebook.indexOfChild(item))
-
-            elif isinstance(item, NotebookTreeWidgetItem):
+            elif isinstance(record, NotebookRecord):
                 # Remove via the api
-                self.delete_notebook_task = DeleteNotebookTask(self.api, item.notebook)
-                self.delete_notebook_task.start()
+                self.mainwindow.task_executor.submit(DeleteNotebookTask(self.api, record.notebook))
 
                 # Remove settings
-                settings.remove(f"notewidget/{item.notebook.uid}/")
-
-                # Check if its notes are opened in a tab
-                ...
+                settings.remove(f"notewidget/{record.notebook.uid}/")
 
-                # Remove from the tree
-                if (index := self.notes_tree_widget.indexOfTopLevelItem(item)) is not None:
-                    self.notes_tree_widget.takeTopLevelItem(index)
+                # Remove from the tree, and the tabs of its opened notes
+                self.remove_notebooks([record.uid])
         elif action == NoteContextAction.Export:
-            if isinstance(item, NoteTreeWidgetItem):
+            if isinstance(record, NoteRecord):
                 fname = QtWidgets.QFileDialog.getSaveFileName(
                     self.mainwindow,
                     "Export",
-                    os.path.join(settings.value("export/path", type=str), get_clean_string(item.note.name)),
+                    os.path.join(settings.value("export/path", type=str), get_clean_string(record.name)),
                     "*.txt"
                 )[0]
 
-                if fname and os.path.exists(os.path.dirname(fname)):
+                if fname and os.path.exists(os.path.dirname(fname)) and (note := self.load_note(record)) is not None:
                     settings.setValue("export/path", os.path.dirname(fname))
-                    self.export_note_task = ExportNoteTask(item.note, fname)
-                    self.export_note_task.started.connect(self.mainwindow.export_started)
-                    self.export_note_task.finished.connect(self.mainwindow.export_finished)
-                    self.export_note_task.failed.connect(self.mainwindow.export_failed)
-                    self.export_note_task.start()
-            elif isinstance(item, NotebookTreeWidgetItem):
+                    self.mainwindow.submit_export(ExportNoteTask(note, fname))
+            elif isinstance(record, NotebookRecord):
                 savedir = QtWidgets.QFileDialog.getExistingDirectory(self, "Export", settings.value("export/path", type=str))
                 if savedir and os.path.exists(savedir):
-                    notes = self.find_notes_in_notebook(item.notebook)
-                    if not notes:
+                    uids = self.find_note_uids_in_notebook(record.notebook)
+                    if not uids:
                         return
                     settings.setValue("export/path", savedir)
-                    self.export_all_notes_task = ExportNotesTask(notes, savedir)
-                    self.export_all_notes_task.started.connect(self.mainwindow.export_started)
-                    self.export_all_notes_task.finished.connect(self.mainwindow.export_finished)
-                    self.export_all_notes_task.failed.connect(self.mainwindow.export_failed)
-                    self.export_all_notes_task.start()
+                    self.mainwindow.submit_export(ExportNotesTask(self.api, uids, savedir))
 
     def filter_changed(self, text: str):
-        # Hide note widget items for which text does not appear in the name
-        for item in self.find_note_widget_items():
-            item.setHidden(text.lower().strip() not in item.note.name.lower())
+        # Hide notes for which text does not appear in the name or the contents, rank the rest
+        self.notes_proxy_model.set_filter(text, dict(self.search_index.search(text)))
 
     def filter_hidden(self):
-        # Make all note widget items visible again when the filter widget is hidden
-        for item in self.find_note_widget_items():
-            item.setHidden(False)
+        # Make all notes visible again when the filter widget is hidden
+        self.notes_proxy_model.set_filter("")
+
+    def notes_indexed_callback(self):
+        if self.filter_notes_widget.isVisible() and self.filter_notes_widget.text():
+            self.filter_changed(self.filter_notes_widget.text())
+
+    def stop_indexing(self):
+        self.index_notes_thread.stop()
+        self.index_notes_thread.wait()
+
+    def expanded_changed(self, index: QtCore.QModelIndex, expanded: bool):
+        if isinstance(record := self.record_at(index), NotebookRecord):
+            settings.setValue(f"notetreewidget/{record.uid}/expanded", int(expanded))
 
     def link_callbacks(self):
-        self.notes_tree_widget.itemClicked.connect(self.item_clicked_callback)
-        self.notes_tree_widget.customContextMenuRequested.connect(self.context_callback)
-        self.notes_tree_widget.itemCollapsed.connect(lambda x: settings.setValue(f"notetreewidget/{x.notebook.uid}/expanded", 0))
-        self.notes_tree_widget.itemExpanded.connect(lambda x: settings.setValue(f"notetreewidget/{x.notebook.uid}/expanded", 1))
+        self.notes_tree_view.clicked.connect(self.item_clicked_callback)
+        self.notes_tree_view.customContextMenuRequested.connect(self.context_callback)
+        self.notes_tree_view.collapsed.connect(lambda index: self.expanded_changed(index, False))
+        self.notes_tree_view.expanded.connect(lambda index: self.expanded_changed(index, True))
         self.filter_notes_widget.textChanged.connect(self.filter_changed)
         self.filter_notes_widget.hidden.connect(self.filter_hidden)
+        self.index_notes_thread.indexed.connect(self.notes_indexed_callback)
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from .__version__ import __title__
+from .etesync import EtesyncNotes, Notebook
+from .settings import get_settings
+
+
+logger = logging.getLogger("logger")
+settings = get_settings(__title__)
+
+
+IMPORT_EXTENSIONS = (".md", ".markdown", ".txt")
+
+
+class SourceFile(object):
+    def __init__(self, path: str, folder: str, name: str, mtime: int):
+        self.path = path  # relative to the source, with "/" separators
+        self.folder = folder  # the directory of path, "" at the top level
+        self.name = name
+        self.mtime = mtime  # milliseconds, like the items' metadata
+
+
+class NotesImporter(object):
+    # Imports the markdown and text files of a directory or a zip archive, with one notebook per folder
+    # (files at the top level go to a notebook named after the source). Notes are created in batches of
+    # etesync/upload/chunksize, several at once, and journaled in the outbox together with the imported paths:
+    # running an interrupted import again skips what was already imported.
+    def __init__(self, api: EtesyncNotes, source: str, concurrency: int = None,
+                 progress: Callable[[int, int], None] = None, cancelled: threading.Event = None):
+        self.api = api
+        self.source = os.path.abspath(source)
+        self.archive = zipfile.ZipFile(self.source) if os.path.isfile(self.source) else None
+        self.root_name = os.path.basename(self.source)
+        if self.archive is not None:
+            self.root_name = os.path.splitext(self.root_name)[0]
+        self.batchsize = max(1, settings.value("etesync/upload/chunksize", type=int))
+        self.concurrency = max(1, concurrency or settings.value("etesync/upload/concurrency", type=int))
+        self.progress = progress
+        self.cancelled = cancelled or threading.Event()
+
+    @staticmethod
+    def is_importable(path: str) -> bool:
+        parts = path.split("/")
+        return (
+            path.lower().endswith(IMPORT_EXTENSIONS)
+            and not any(part.startswith(".") or part == "__MACOSX" for part in parts)
+        )
+
+    def scan(self) -> List[SourceFile]:
+        files = []
+        if self.archive is not None:
+            for info in self.archive.infolist():
+                if info.is_dir() or not self.is_importable(info.filename):
+                    continue
+                mtime = int(time.mktime(info.date_time + (0, 0, -1)) * 1000)
+                files.append(self.source_file(info.filename, mtime))
+        else:
+            for root, directories, names in os.walk(self.source):
+                relative = os.path.relpath(root, self.source).replace(os.sep, "/")
+                for name in names:
+                    path = name if relative == "." else f"{relative}/{name}"
+                    if self.is_importable(path):
+                        files.append(self.source_file(path, int(os.stat(os.path.join(root, name)).st_mtime * 1000)))
+        return sorted(files, key=lambda f: f.path)
+
+    @staticmethod
+    def source_file(path: str, mtime: int) -> SourceFile:
+        folder, _, filename = path.rstrip("/").rpartition("/")
+        return SourceFile(path, folder, os.path.splitext(filename)[0], mtime)
+
+    def read(self, path: str) -> bytes:
+        if self.archive is not None:
+            return self.archive.read(path)
+        with open(os.path.join(self.source, *path.split("/")), "rb") as f:
+            return f.read()
+
+    def notebooks(self, files: List[SourceFile], imported: Dict[str, str]) -> Dict[str, Notebook]:
+        # The notebook of every folder, created unless a previous run did. Folders are recorded with a trailing "/".
+        notebooks = {}
+        for folder in dict.fromkeys(f.folder for f in files):
+            notebook = None
+            if (uid := imported.get(folder + "/")) is not None:
+                notebook = self.api.get_cached_notebook(uid)
+            if notebook is None:
+                notebook = self.api.create_notebook(folder or self.root_name, "", "")
+                self.api.cache.record_imports(self.source, [(folder + "/", notebook.uid)])
+            notebooks[folder] = notebook
+        return notebooks
+
+    def queue_batch(self, notebook: Notebook, batch: List[SourceFile]) -> List[str]:
+        return self.api.queue_imported_notes(notebook, self.source, [(f.path, f.name, f.mtime, self.read(f.path)) for f in batch])
+
+    def run(self) -> Tuple[int, int, int]:
+        # Returns the number of imported notes, of skipped (previously imported) files and of imported notes
+        # that are still queued for uploading
+        start = time.perf_counter()
+        files = self.scan()
+        imported = self.api.cache.get_imports(self.source)
+        pending = [f for f in files if f.path not in imported]
+        if not pending:
+            return 0, len(files), 0
+
+        notebooks = self.notebooks(pending, imported)
+        batches: List[Tuple[Notebook, List[SourceFile]]] = []
+        for folder, notebook in notebooks.items():
+            folder_files = [f for f in pending if f.folder == folder]
+            batches += [(notebook, folder_files[i:i + self.batchsize]) for i in range(0, len(folder_files), self.batchsize)]
+
+        queued, uploaded, offline = [], set(), False
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="import") as executor:
+            for i in range(0, len(batches), self.concurrency):
+                if self.cancelled.is_set():
+                    break
+                for uids in executor.map(lambda batch: self.queue_batch(*batch), batches[i:i + self.concurrency]):
+                    queued += uids
+                if not offline:
+                    flushed = self.api.flush_outbox()
+                    uploaded |= flushed
+                    # Keep importing into the outbox without uploading, the sync loop retries later
+                    offline = not flushed and self.api.cache.count_outbox() > 0
+                if self.progress is not None:
+                    self.progress(len(queued), len(pending))
+
+        remaining = sum(1 for uid in queued if uid not in uploaded)
+        logger.debug(f"NotesImporter.run: {len(queued)} notes imported from {self.source} into {len(notebooks)} notebooks, "
+                     f"{remaining} queued, {len(files) - len(pending)} skipped, in {time.perf_counter() - start:.2f}s.")
+        return len(queued), len(files) - len(pending), remaining
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
@@ -0,0 +1,127 @@
+from difflib import SequenceMatcher
+from typing import List, Tuple
+
+
+CONFLICT_LOCAL = "<<<<<<< local\n"
+CONFLICT_SEPARATOR = "=======\n"
+CONFLICT_REMOTE = ">>>>>>> remote\n"
+
+# Characters that QTextDocument.toPlainText returns differently: line and paragraph separators become "\n",
+# non-breaking spaces plain spaces ("\r\n" is handled first)
+PLAIN_TEXT_TABLE = str.maketrans({"\r": "\n", "\u2028": "\n", "\u2029": "\n", "\xa0": " "})
+
+
+def normalize_text(text: str) -> str:
+    # The text as the editor holds it after setPlainText, positions of merges and diffs refer to this form
+    return text.replace("\r\n", "\n").translate(PLAIN_TEXT_TABLE)
+
+
+def has_conflicts(text: str) -> bool:
+    # Conflict markers of merge3 that were not resolved yet
+    lines = set(text.split("\n"))
+    return CONFLICT_LOCAL.rstrip("\n") in lines and CONFLICT_REMOTE.rstrip("\n") in lines
+
+
+def _map_position(opcodes: List[Tuple[str, int, int, int, int]], position: int, last: bool) -> int:
+    # Map a line index in a to one in b at a hunk boundary. At an insertion point, the first match lies before the
+    # inserted lines and the last match after them.
+    mapped = None
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal" and i1 <= position <= i2:
+            match = j1 + position - i1
+        elif tag != "equal" and position in (i1, i2):
+            match = j2 if position == i2 and (last or position != i1) else j1
+        else:
+            continue
+        if not last:
+            return match
+        mapped = match
+    return mapped if mapped is not None else 0
+
+
+def merge3(base: str, local: str, remote: str) -> Tuple[List[Tuple[int, int, str]], int]:
+    # Line based three-way merge of remote into local, both derived from base.
+    # Returns the edits (start, end, text) to apply to local, as character indices of local in ascending order,
+    # and the number of conflicts. Hunks changed on both sides (or touching) that differ are kept as conflict markers.
+    base_lines = base.splitlines(keepends=True)
+    local_lines = local.splitlines(keepends=True)
+    remote_lines = remote.splitlines(keepends=True)
+    local_opcodes = SequenceMatcher(None, base_lines, local_lines, autojunk=False).get_opcodes()
+    remote_opcodes = SequenceMatcher(None, base_lines, remote_lines, autojunk=False).get_opcodes()
+
+    hunks = sorted(
+        [(i1, i2, False) for tag, i1, i2, _, _ in local_opcodes if tag != "equal"] +
+        [(i1, i2, True) for tag, i1, i2, _, _ in remote_opcodes if tag != "equal"]
+    )
+
+    # Clusters of touching hunks in base lines: (start, end, changed locally, changed remotely)
+    clusters = []
+    for i1, i2, is_remote in hunks:
+        if clusters and i1 <= clusters[-1][1]:
+            start, end, is_local_cluster, is_remote_cluster = clusters[-1]
+            clusters[-1] = (start, max(end, i2), is_local_cluster or not is_remote, is_remote_cluster or is_remote)
+        else:
+            clusters.append((i1, i2, not is_remote, is_remote))
+
+    line_starts = [0]
+    for line in local_lines:
+        line_starts.append(line_starts[-1] + len(line))
+
+    edits, conflicts = [], 0
+    for start, end, is_local_cluster, is_remote_cluster in clusters:
+        if not is_remote_cluster:
+            continue
+        l1, l2 = _map_position(local_opcodes, start, False), _map_position(local_opcodes, end, True)
+        r1, r2 = _map_position(remote_opcodes, start, False), _map_position(remote_opcodes, end, True)
+        local_text, remote_text = "".join(local_lines[l1:l2]), "".join(remote_lines[r1:r2])
+        if local_text == remote_text:
+            continue
+        if not is_local_cluster:
+            text = remote_text
+        else:
+            conflicts += 1
+            text = (
+                CONFLICT_LOCAL + local_text + ("" if local_text.endswith("\n") or not local_text else "\n") +
+                CONFLICT_SEPARATOR + remote_text + ("" if remote_text.endswith("\n") or not remote_text else "\n") +
+                CONFLICT_REMOTE
+            )
+        edits.append((line_starts[l1], line_starts[l2], text))
+
+    return edits, conflicts
+
+
+def diff_edits(old: str, new: str) -> List[Tuple[int, int, str]]:
+    # Line based edits (start, end, text) that turn old into new, as character indices of old in ascending order
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+
+    # Only diff what lies between the common first and last lines, remote updates usually touch a few places
+    prefix, length = 0, min(len(old_lines), len(new_lines))
+    while prefix < length and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < length - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+
+    line_starts = [0]
+    for line in old_lines:
+        line_starts.append(line_starts[-1] + len(line))
+
+    old_middle = old_lines[prefix:len(old_lines) - suffix]
+    new_middle = new_lines[prefix:len(new_lines) - suffix]
+    return [
+        (line_starts[prefix + i1], line_starts[prefix + i2], "".join(new_middle[j1:j2]))
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_middle, new_middle, autojunk=False).get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def apply_edits(text: str, edits: List[Tuple[int, int, str]]) -> str:
+    for start, end, replacement in reversed(edits):
+        text = text[:start] + replacement + text[end:]
+    return text
+
+
+def utf16_length(text: str) -> int:
+    # QTextDocument positions count UTF-16 code units
+    return len(text.encode("utf-16-le")) // 2
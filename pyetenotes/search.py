@@ -0,0 +1,92 @@
+import bisect
+import logging
+import math
+import re
+import threading
+from typing import Dict, List, Tuple
+
+
+logger = logging.getLogger("logger")
+
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+TITLE_WEIGHT = 3
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex(object):
+    # In-memory inverted index over note titles and contents, nothing is written to disk
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings: Dict[str, Dict[str, int]] = {}  # token -> {uid: weighted term frequency}
+        self.documents: Dict[str, Dict[str, int]] = {}  # uid -> {token: weighted term frequency}
+        self.tokens: List[str] = []  # sorted, for prefix lookups
+
+    def update(self, uid: str, title: str, content: str):
+        frequencies: Dict[str, int] = {}
+        for token in tokenize(title):
+            frequencies[token] = frequencies.get(token, 0) + TITLE_WEIGHT
+        for token in tokenize(content):
+            frequencies[token] = frequencies.get(token, 0) + 1
+
+        with self.lock:
+            self.remove(uid)
+            self.documents[uid] = frequencies
+            for token, frequency in frequencies.items():
+                if (posting := self.postings.get(token)) is None:
+                    posting = self.postings[token] = {}
+                    bisect.insort(self.tokens, token)
+                posting[uid] = frequency
+
+    def remove(self, uid: str):
+        with self.lock:
+            for token in self.documents.pop(uid, {}):
+                posting = self.postings[token]
+                del posting[uid]
+                if not posting:
+                    del self.postings[token]
+                    del self.tokens[bisect.bisect_left(self.tokens, token)]
+
+    def clear(self):
+        with self.lock:
+            self.postings.clear()
+            self.documents.clear()
+            self.tokens.clear()
+
+    def prefixed(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self.tokens, prefix)
+        end = bisect.bisect_left(self.tokens, prefix + "\U0010ffff")
+        return self.tokens[start:end]
+
+    def search(self, query: str) -> List[Tuple[str, float]]:
+        # Notes matching every term of query (the last one as a prefix, while typing), best tf-idf score first
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self.lock:
+            count = len(self.documents) or 1
+            scores: Dict[str, float] = {}
+            for i, term in enumerate(terms):
+                tokens = self.prefixed(term) if i == len(terms) - 1 else [term] if term in self.postings else []
+                term_scores: Dict[str, float] = {}
+                for token in tokens:
+                    posting = self.postings[token]
+                    idf = math.log(1 + count / len(posting))
+                    for uid, frequency in posting.items():
+                        term_scores[uid] = max(term_scores.get(uid, 0.0), (1 + math.log(frequency)) * idf)
+                if i == 0:
+                    scores = term_scores
+                else:
+                    scores = {uid: score + term_scores[uid] for uid, score in scores.items() if uid in term_scores}
+                if not scores:
+                    return []
+
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+    def __len__(self) -> int:
+        return len(self.documents)
@@ -1,2 +1,50 @@
-from .settings import Settings
+import threading
+from typing import Any, Callable
+
 from . import default_settings
+from .default_settings import DEFAULT_SETTINGS
+from .file_settings import FileSettings
+
+
+_factory: Callable[[str], Any] = None
+_lock = threading.Lock()
+
+
+def __getattr__(name: str) -> Any:
+    # Settings is a QSettings, Qt is only imported when it is used
+    if name == "Settings":
+        from .settings import Settings
+        return Settings
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def use_settings(factory: Callable[[str], Any]):
+    # Select the backend behind get_settings before any setting is read, Settings (QSettings) by default
+    global _factory
+    _factory = factory
+
+
+def get_settings(name: str) -> "SettingsProxy":
+    return SettingsProxy(name)
+
+
+class SettingsProxy(object):
+    # Settings of the modules that also run without Qt, the backend is created on first use
+
+    def __init__(self, name: str):
+        self._name = name
+        self._backend = None
+
+    def backend(self) -> Any:
+        if self._backend is None:
+            with _lock:
+                if self._backend is None:
+                    if _factory is None:
+                        from .settings import Settings
+                        self._backend = Settings(self._name)
+                    else:
+                        self._backend = _factory(self._name)
+        return self._backend
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self.backend(), attribute)
@@ -1,39 +1,52 @@
 import os
-
-from PyQt5 import QtCore, QtGui
+import sys
 
 from ..__version__ import __title__
 
 
-font_edit = QtGui.QFont()
-font_edit.setFamily("Noto Mono")
-font_edit.setStyleHint(QtGui.QFont.Monospace)
-font_edit.setFixedPitch(True)
-font_edit.setPointSize(10)
-
-
-font_preview = QtGui.QFont()
-font_preview.setFamily("Noto Sans")
-font_preview.setPointSize(10)
+def cache_location() -> str:
+    # Where QStandardPaths.CacheLocation points to before the application is named, without importing Qt
+    if sys.platform == "win32":
+        return os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "cache")
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Caches")
+    return os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
 
 
-path = QtCore.QStandardPaths.standardLocations(QtCore.QStandardPaths.CacheLocation)[0]
+path = cache_location()
 os.makedirs(path, exist_ok=True)
-cache_path = os.path.join(path, f"{__title__}-cache.bytes")
+cache_path = os.path.join(path, f"{__title__}-cache.sqlite")
+home_path = os.path.expanduser("~")
 
 
 DEFAULT_SETTINGS = {
     "style": "default",
     "cache/path": cache_path,
-    "tasks/interval": 60,
+    "cache/load/chunksize": 1000,
+    "etesync/pagesize": 50,
+    "tasks/fetch/concurrency": 4,
+    "tasks/workers": 4,
+    "etesync/upload/chunksize": 50,
+    "etesync/upload/concurrency": 4,
+    "etesync/outbox/maxattempts": 20,
+    "etesync/contentcache/size": 64,
+    "autosave/enabled": False,
+    "autosave/idle": 3,  # seconds
+    "autosave/maxdelay": 30,  # seconds
     "export/extension": "txt",
-    "export/path": QtCore.QStandardPaths.standardLocations(QtCore.QStandardPaths.HomeLocation)[0],
+    "export/format": "txt",  # txt, md or html
+    "export/folders": False,
+    "export/workers": 8,
+    "export/path": home_path,
+    "import/path": home_path,
     "notestabwidget/showcolors": True,
     "notestreewidget/showcolors": True,
     "notestreewidget/color/alpha": 100,
+    "notestreewidget/fetchsize": 500,
     "filternoteswidget/visible": True,
-    "notewidget/font/edit": font_edit,
-    "notewidget/font/preview": font_preview,
+    "notepreviewwidget/render/delay": 150,
+    "notepreviewwidget/cache/count": 32,
+    "notepreviewwidget/cache/size": 65536,  # KiB
     "shortcuts/new_note": "Ctrl+N",
     "shortcuts/new_notebook": "Ctrl+Shift+N",
     "shortcuts/save": "Ctrl+S",
@@ -47,4 +60,5 @@ DEFAULT_SETTINGS = {
     "shortcuts/previous_tab": "Ctrl+Shift+Tab",
     "shortcuts/toggle_filter": "Ctrl+Shift+F",
     "tasks/update_notebooks/interval": 0,
+    "tasks/update_notebooks/focus_interval": 30,
 }
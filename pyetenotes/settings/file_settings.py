@@ -0,0 +1,73 @@
+import base64
+import json
+import os
+import threading
+from typing import Any, Dict
+
+from ..__version__ import __title__
+from .default_settings import DEFAULT_SETTINGS
+
+
+class FileSettings(object):
+    # Settings kept in a JSON file, with the interface of Settings (a QSettings) for use without Qt.
+    # Every change is written to the file right away. The notes are cached next to the file, apart from the GUI's
+    # cache: that one belongs to the GUI's session and holds its outbox.
+
+    def __init__(self, path: str):
+        self.path = path
+        self.defaults = dict(DEFAULT_SETTINGS)
+        self.defaults["cache/path"] = os.path.join(os.path.dirname(os.path.abspath(path)), f"{__title__}-cli-cache.sqlite")
+        self.lock = threading.RLock()
+        self.values: Dict[str, Any] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.values = json.load(f)
+
+    def value(self, key: str, defaultValue: Any = None, type: Any = None) -> Any:
+        with self.lock:
+            value = self.values.get(key)
+        if isinstance(value, dict) and "base64" in value:
+            value = base64.b64decode(value["base64"])
+        if value is None:
+            value = defaultValue or self.defaults.get(key)
+        if not type:
+            return value
+        if value is None:
+            return type()
+        if type is bool and isinstance(value, str):
+            return value.lower() in ["true", "1"]
+        if type is bytes and isinstance(value, str):
+            return value.encode()
+        if type is str and isinstance(value, bytes):
+            return value.decode()
+        return type(value)
+
+    def setValue(self, key: str, value: Any) -> None:
+        if isinstance(value, bytes):
+            value = {"base64": base64.b64encode(value).decode()}
+        with self.lock:
+            self.values[key] = value
+            self.sync()
+
+    def remove(self, key: str) -> None:
+        # Like QSettings.remove: the key and every key below it
+        group = key.rstrip("/")
+        with self.lock:
+            self.values = {k: v for k, v in self.values.items() if k != group and not k.startswith(group + "/")}
+            self.sync()
+
+    def contains(self, key: str) -> bool:
+        with self.lock:
+            return key in self.values
+
+    def sync(self) -> None:
+        # Written to a temporary file first, the file holds the session keys and is only readable by the user
+        with self.lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary = self.path + ".tmp"
+            fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.values, f, indent=4, sort_keys=True)
+            os.replace(temporary, self.path)
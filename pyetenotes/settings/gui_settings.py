@@ -0,0 +1,24 @@
+from PyQt5 import QtGui
+
+from .default_settings import DEFAULT_SETTINGS
+
+
+# Defaults that need Qt, registered along with the QSettings backend
+
+
+font_edit = QtGui.QFont()
+font_edit.setFamily("Noto Mono")
+font_edit.setStyleHint(QtGui.QFont.Monospace)
+font_edit.setFixedPitch(True)
+font_edit.setPointSize(10)
+
+
+font_preview = QtGui.QFont()
+font_preview.setFamily("Noto Sans")
+font_preview.setPointSize(10)
+
+
+DEFAULT_SETTINGS.update({
+    "notewidget/font/edit": font_edit,
+    "notewidget/font/preview": font_preview,
+})
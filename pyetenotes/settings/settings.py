@@ -1,5 +1,6 @@
 from typing import Any
 from .default_settings import DEFAULT_SETTINGS
+from . import gui_settings
 
 
 from PyQt5 import QtCore
@@ -1,77 +1,216 @@
 import abc
-import schedule
 import logging
-import os
+import queue
+import random
+import threading
 import time
 
-from typing import List
+from typing import Iterable, List
 from PyQt5 import QtCore
 from PyQt5.QtCore import pyqtSignal
 
 from .__version__ import __title__
 from .etesync import EtesyncNotes, Note, Notebook
-from .settings import Settings
-from .utils import get_clean_string
+from .executor import Priority
+from .export import NotesExporter, export_format, render
+from .fetch import FetchScheduler
+from .importer import NotesImporter
+from .search import SearchIndex
+from .settings import get_settings
 
 
 logger = logging.getLogger("logger")
-settings = Settings(__title__)
+settings = get_settings(__title__)
+
+# seconds
+SYNC_BACKOFF_BASE = 5
+SYNC_BACKOFF_MAX = 600
+# notes loaded from the cache at once for indexing
+INDEX_CHUNKSIZE = 200
 
 
 class TasksThread(QtCore.QThread):
     new_updates_signal = pyqtSignal(dict)
+    outbox_report_signal = pyqtSignal(list, int, int)
 
     def __init__(self, api: EtesyncNotes):
         super(TasksThread, self).__init__()
         self.running = False
         self.api = api
-        self.interval = settings.value("tasks/interval", type=int)
+        self.fetch_scheduler = FetchScheduler(api)
+        self.condition = threading.Condition()
+        self.woken = False
+        self.failures = 0
+        self.last_run = None
+        self.next_run = time.monotonic()  # run once at the start
+        self.stuck = 0  # changes the outbox gave up on, reported when there are more
         self.set_schedule()
 
     def set_schedule(self):
-        schedule.clear("update_notebooks")
-        # set a large interval such that the task is ran once at the start (schedule.ran_all())
-        schedule.every(settings.value("tasks/update_notebooks/interval", type=int) or 5256000).minutes.do(self.update_notebooks).tag("update_notebooks")
-
-    def run(self):
+        # An interval of 0 only updates at the start and when woken
+        with self.condition:
+            self.interval = 60 * settings.value("tasks/update_notebooks/interval", type=int)
+            if self.last_run is not None and not self.failures:
+                self.next_run = self.last_run + self.interval if self.interval else None
+            self.condition.notify()
+
+    def wake(self, min_age: float = 0):
+        # Update now, unless the last update is more recent than min_age seconds
+        with self.condition:
+            if self.last_run is None or time.monotonic() - self.last_run >= min_age:
+                self.woken = True
+                self.condition.notify()
+
+    def start(self, *args, **kwargs):
         self.running = True
-        try:
-            schedule.run_all()
-            while self.running:
-                time.sleep(self.interval)
-                schedule.run_pending()
-        except Exception as e:
-            logger.error(f"TasksThread: {e}")
-        finally:
+        super().start(*args, **kwargs)
+
+    def stop(self):
+        with self.condition:
             self.running = False
+            self.condition.notify()
+
+    def wait_next_run(self) -> bool:
+        # Returns False when the thread was stopped
+        with self.condition:
+            while self.running and not self.woken:
+                timeout = None if self.next_run is None else self.next_run - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                self.condition.wait(timeout)
+            self.woken = False
+            return self.running
 
-    def update_notebooks(self):
-        updates = {
-            "notebooks": self.api.get_notebooks(changes=True),
-            "notes": []
-        }
+    def run(self):
+        while self.wait_next_run():
+            try:
+                self.update_notebooks()
+            except Exception as e:
+                self.failures += 1
+                # Jittered exponential backoff, the interval still applies when it is shorter
+                delay = min(SYNC_BACKOFF_MAX, SYNC_BACKOFF_BASE * 2 ** (self.failures - 1)) * random.uniform(0.5, 1.5)
+                if self.interval:
+                    delay = min(delay, self.interval)
+                logger.error(f"TasksThread: update failed ({self.failures} in a row), retrying in {delay:.0f}s: {e}")
+            else:
+                self.failures = 0
+                delay = self.interval or None
+
+            with self.condition:
+                self.last_run = time.monotonic()
+                self.next_run = self.last_run + delay if delay else None
 
-        if updates["notebooks"]:
-            for notebook in updates["notebooks"]:
-                updates["notes"] += self.api.get_notes(notebook, changes=True)
+    def update_notebooks(self):
+        # Upload changes that were made while offline before fetching
+        self.api.flush_outbox()
+        self.report_outbox()
+
+        notebooks, removed_notebooks = self.api.get_notebook_changes()
+        if notebooks or removed_notebooks:
+            self.emit_updates(notebooks=notebooks, removed_notebooks=removed_notebooks)
+
+        # Only notebooks whose contents changed are returned, each fetched from its own sync token.
+        # The notebooks are fetched in parallel and every page is emitted as soon as it arrives,
+        # so the tree fills while the rest is downloaded.
+        for notes, removed_notes in self.fetch_scheduler.iter_note_changes(notebooks):
+            if not self.running:
+                # Stopped, closing the iterator cancels the remaining fetches
+                return
+            if notes or removed_notes:
+                self.emit_updates(notes=notes, removed_notes=removed_notes)
+
+        # Only now the notebook changes are complete, an interrupted run fetches them again
+        self.api.commit_notebook_changes()
+        self.api.cache_save()
+
+    def report_outbox(self):
+        # The notes whose changes conflicted have the server's revision now, their local changes are in copies
+        conflicts, dropped, stuck = self.api.take_outbox_report()
+        if conflicts:
+            self.emit_updates(
+                notes=[note for note, _ in conflicts if not note.item.deleted],
+                removed_notes=[note.uid for note, _ in conflicts if note.item.deleted]
+            )
+        if conflicts or dropped or stuck > self.stuck:
+            self.outbox_report_signal.emit([copy for _, copy in conflicts if copy], dropped, stuck)
+        self.stuck = stuck
+
+    def emit_updates(self, notebooks: List[Notebook] = None, notes: List[Note] = None, removed_notebooks: List[str] = None, removed_notes: List[str] = None):
+        self.new_updates_signal.emit({
+            "notebooks": notebooks or [],
+            "notes": notes or [],
+            "removed_notebooks": removed_notebooks or [],
+            "removed_notes": removed_notes or [],
+        })
+
+
+class IndexNotesThread(QtCore.QThread):
+    indexed = pyqtSignal()
+
+    def __init__(self, api: EtesyncNotes, index: SearchIndex):
+        super(IndexNotesThread, self).__init__()
+        self.api = api
+        self.index = index
+        self.queue = queue.Queue()
 
-        if updates["notebooks"] or updates["notes"]:
-            self.new_updates_signal.emit(updates)
+    def add(self, uids: Iterable[str]):
+        if uids := list(uids):
+            self.queue.put(uids)
 
+    def stop(self):
+        self.queue.put(None)
 
-class BaseTask(QtCore.QThread):
+    def run(self):
+        # Load, decrypt and index notes off the GUI thread, in the order they were added. Notes are loaded from
+        # the cache a chunk at a time, so only their latest cached revision is indexed and little is kept in memory.
+        while (uids := self.queue.get()) is not None:
+            for i in range(0, len(uids), INDEX_CHUNKSIZE):
+                try:
+                    notes = self.api.get_cached_notes(uids[i:i + INDEX_CHUNKSIZE])
+                except Exception as e:
+                    logger.error(f"IndexNotesThread: failed to load {len(uids[i:i + INDEX_CHUNKSIZE])} notes: {e}")
+                    continue
+                for note in notes:
+                    try:
+                        self.index.update(note.uid, note.name, note.get_content(cache=False).decode(errors="replace"))
+                    except Exception as e:
+                        logger.error(f"IndexNotesThread: failed to index {note.uid}: {e}")
+            if self.queue.empty():
+                self.indexed.emit()
+
+
+class BaseTask(QtCore.QObject):
+    # Run by the TaskExecutor on one of its threads, the signals are delivered on the GUI thread
+    started = pyqtSignal()
+    finished = pyqtSignal()
     failed = pyqtSignal()
+    priority = Priority.Normal
+    cancellable = False  # long running tasks that stop early when cancelled, e.g. when the window closes
 
     def __init__(self):
         super(BaseTask, self).__init__()
         self.running = False
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        if self.cancellable:
+            self.cancelled.set()
+
+    def keys(self) -> List[str]:
+        # Tasks sharing a key run in the order they were submitted
+        return []
 
     @abc.abstractmethod
     def task(self):
         ...
 
     def run(self):
+        if self.cancelled.is_set():
+            # Cancelled before it started
+            self.finished.emit()
+            return
         self.running = True
+        self.started.emit()
         try:
             self.task()
         except Exception as e:
@@ -79,16 +218,59 @@ class BaseTask(QtCore.QThread):
             self.failed.emit()
         finally:
             self.running = False
+            self.finished.emit()
+
+
+class CacheLoadTask(BaseTask):
+    # Deserialize the cache off the GUI thread: the notebooks first, then the notes in chunks
+    notebooks_loaded = pyqtSignal(list)
+    notes_loaded = pyqtSignal(list)
+    priority = Priority.High
+
+    def __init__(self, api: EtesyncNotes):
+        super(CacheLoadTask, self).__init__()
+        self.api = api
+        self.chunksize = max(1, settings.value("cache/load/chunksize", type=int))
+        self.count = 0
+
+    def task(self):
+        start = time.perf_counter()
+        notebooks, notes = self.api.cache_load()
+        self.notebooks_loaded.emit(notebooks)
+        chunk = []
+        for note in notes:
+            chunk.append(note)
+            if len(chunk) >= self.chunksize:
+                self.notes_loaded.emit(chunk)
+                self.count += len(chunk)
+                chunk = []
+        if chunk:
+            self.notes_loaded.emit(chunk)
+            self.count += len(chunk)
+        logger.debug(f"CacheLoadTask: {len(notebooks)} notebooks and {self.count} notes loaded in {time.perf_counter() - start:.2f}s.")
 
 
 class SaveNotesTask(BaseTask):
+    saved = pyqtSignal(list)
+    notes_queued = pyqtSignal(list)
+    priority = Priority.High
+
     def __init__(self, api: EtesyncNotes, notes: List[Note]):
         super(SaveNotesTask, self).__init__()
         self.api = api
         self.notes = notes
 
+    def keys(self) -> List[str]:
+        # Ordered with other tasks on the same notes and notebooks
+        return [note.uid for note in self.notes] + [note.notebook.uid for note in self.notes]
+
     def task(self):
-        self.api.save_notes(self.notes)
+        # Notes that an earlier queued save already uploaded, and that did not change since, are skipped
+        saved, failed = self.api.save_notes(self.notes)
+        self.saved.emit(saved)
+        if failed:
+            logger.warning(f"SaveNotesTask: {len(failed)} of {len(self.notes)} notes could not be uploaded, they stay queued.")
+            self.notes_queued.emit(failed)
 
 
 class CreateNotebookTask(BaseTask):
@@ -128,6 +310,9 @@ class DeleteNoteTask(BaseTask):
         self.api = api
         self.note = note
 
+    def keys(self) -> List[str]:
+        return [self.note.uid]
+
     def task(self):
         self.api.remove_note(self.note)
         self.deleted.emit(self.note)
@@ -141,33 +326,39 @@ class DeleteNotebookTask(BaseTask):
         self.api = api
         self.notebook = notebook
 
+    def keys(self) -> List[str]:
+        return [self.notebook.uid]
+
     def task(self):
         self.api.remove_notebook(self.notebook)
         self.deleted.emit(self.notebook)
 
 
 class ExportNotesTask(BaseTask):
-    def __init__(self, notes: List[Note], savedir: str = "", extension: str = "txt"):
+    priority = Priority.Low
+    cancellable = True
+    progress = pyqtSignal(int, int)
+
+    def __init__(self, api: EtesyncNotes, uids: List[str], destination: str = "", format: str = None, extension: str = None):
         super(ExportNotesTask, self).__init__()
-        self.notes = notes
-        self.savedir = savedir
+        self.api = api
+        self.uids = uids
+        self.destination = destination  # a directory, or a .zip/.tar/.tar.gz/.jsonl file
+        self.format = format
         self.extension = extension
 
-    def task(self):
-        for note in self.notes:
-            name = get_clean_string(note.name)
-            savepath = os.path.join(self.savedir, f"{name}.{self.extension}")
-
-            i = 1
-            while os.path.exists(savepath):
-                savepath = os.path.join(self.savedir, f"{name} ({i}).{self.extension}")
-                i += 1
+    def keys(self) -> List[str]:
+        # After the queued saves of these notes, those write their new contents to the cache
+        return self.uids
 
-            with open(savepath, "wb") as f:
-                f.write(note.content)
+    def task(self):
+        notes = self.api.get_cached_notes(self.uids)
+        NotesExporter(notes, self.destination, self.format, self.extension, progress=self.progress.emit, cancelled=self.cancelled).export()
 
 
 class ExportNoteTask(BaseTask):
+    priority = Priority.Low
+
     def __init__(self, note: Note, savename: str):
         super(ExportNoteTask, self).__init__()
         self.note = note
@@ -175,4 +366,23 @@ class ExportNoteTask(BaseTask):
 
     def task(self):
         with open(self.savename, "wb") as f:
-            f.write(self.note.content)
+            f.write(render(self.note, export_format(self.savename)))
+
+
+class ImportNotesTask(BaseTask):
+    priority = Priority.Low
+    cancellable = True  # importing again resumes where it stopped
+    progress = pyqtSignal(int, int)
+    imported = pyqtSignal(int, int, int)
+
+    def __init__(self, api: EtesyncNotes, source: str):
+        super(ImportNotesTask, self).__init__()
+        self.api = api
+        self.source = source  # a directory or a zip archive
+
+    def task(self):
+        importer = NotesImporter(self.api, self.source, progress=self.progress.emit, cancelled=self.cancelled)
+        try:
+            self.imported.emit(*importer.run())
+        finally:
+            importer.close()
@@ -1,4 +1,8 @@
 import string
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Hashable
 
 
 def center_widget(parent, widget):
@@ -14,3 +18,89 @@ def center_widget(parent, widget):
 def get_clean_string(s: str):
     disallowed = "\\/:*?\"<>|"
     return "".join(filter(lambda c: c not in disallowed, s))
+
+
+class LRUCache(object):
+    # Bounded by the number of entries and, when maxcost is given, by the summed cost of the entries
+    def __init__(self, maxsize: int, maxcost: int = None):
+        self.maxsize = maxsize
+        self.maxcost = maxcost
+        self.cost = 0
+        self.data = OrderedDict()
+        self.costs = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            if key not in self.data:
+                return default
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def put(self, key: Hashable, value: Any, cost: int = 0):
+        with self.lock:
+            self.cost += cost - self.costs.get(key, 0)
+            self.data[key] = value
+            self.costs[key] = cost
+            self.data.move_to_end(key)
+            # The most recent entry is kept even when it exceeds maxcost on its own
+            while len(self.data) > self.maxsize or (self.maxcost is not None and self.cost > self.maxcost and len(self.data) > 1):
+                evicted, _ = self.data.popitem(last=False)
+                self.cost -= self.costs.pop(evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            self.cost -= self.costs.pop(key, 0)
+            return self.data.pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.costs.clear()
+            self.cost = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+class LatencyStats(object):
+    # Durations (in seconds) of the most recent operations
+    def __init__(self, window: int = 100):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def summary(self) -> Dict[str, float]:
+        with self.lock:
+            count, recent = self.count, list(self.samples)
+        if not recent:
+            return {"count": count, "last": 0.0, "mean": 0.0, "p95": 0.0, "max": 0.0}
+        samples = sorted(recent)
+        return {
+            "count": count,
+            "last": recent[-1],
+            "mean": sum(samples) / len(samples),
+            "p95": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+            "max": samples[-1],
+        }
+
+
+class StartupTimer(object):
+    # Seconds since start at which the named startup steps completed, each step is only recorded once
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, step: str):
+        self.marks.setdefault(step, time.perf_counter() - self.start)
+
+    def report(self) -> str:
+        return ", ".join(f"{step} {seconds * 1000:.0f} ms" for step, seconds in self.marks.items())
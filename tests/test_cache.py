@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from pyetenotes.cache import NotesCache
+
+
+class OutboxTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = NotesCache(os.path.join(self.directory.name, "cache.sqlite"))
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def item(self, uid: str) -> bytes:
+        rows = self.cache.get_items([uid])
+        return rows[0][2] if rows else None
+
+    def test_queued_again_coalesces(self):
+        self.cache.queue_items("c", [("a", b"a1"), ("b", b"b1")])
+        self.cache.queue_items("c", [("a", b"a2")])
+        self.cache.queue_items("c", [], removed=[("b", b"b2")])
+        self.assertEqual(self.cache.iter_outbox(5), [("a", "c", b"a2", 0, 1), ("b", "c", b"b2", 1, 1)])
+        self.assertEqual(self.item("a"), b"a2")
+        self.assertIsNone(self.item("b"))
+
+    def test_queued_again_resets_attempts(self):
+        self.cache.queue_items("c", [("a", b"a1")])
+        self.cache.retry_items(["a"])
+        self.cache.retry_items(["a"])
+        self.assertEqual(self.cache.count_stuck(2), 1)
+        self.cache.queue_items("c", [("a", b"a2")])
+        self.assertEqual(self.cache.count_stuck(2), 0)
+        self.assertEqual(len(self.cache.iter_outbox(1)), 1)
+
+    def test_complete_items(self):
+        self.cache.queue_items("c", [("a", b"a1"), ("b", b"b1")])
+        self.cache.complete_items("c", [("a", 0, b"a1 uploaded", False), ("b", 0, b"b1 uploaded", True)])
+        self.assertEqual(self.cache.count_outbox(), 0)
+        self.assertEqual(self.item("a"), b"a1 uploaded")
+        self.assertIsNone(self.item("b"))
+
+    def test_complete_items_queued_again(self):
+        # The upload of version 0 finishes after the note was changed again, the newer change stays queued
+        self.cache.queue_items("c", [("a", b"a1")])
+        self.cache.queue_items("c", [("a", b"a2")])
+        self.cache.complete_items("c", [("a", 0, b"a1 uploaded", False)])
+        self.assertEqual(self.cache.iter_outbox(5), [("a", "c", b"a2", 0, 1)])
+        self.assertEqual(self.item("a"), b"a2")
+        self.cache.complete_items("c", [("a", 1, b"a2 uploaded", False)])
+        self.assertEqual(self.cache.count_outbox(), 0)
+        self.assertEqual(self.item("a"), b"a2 uploaded")
+
+    def test_save_items_keeps_queued(self):
+        self.cache.queue_items("c", [("a", b"local")])
+        self.cache.save_items("c", [("a", b"fetched"), ("b", b"fetched")], removed=["a"])
+        self.assertEqual(self.item("a"), b"local")
+        self.assertEqual(self.item("b"), b"fetched")
+
+    def test_resolve_conflict(self):
+        self.cache.queue_items("c", [("a", b"local")])
+        self.assertFalse(self.cache.resolve_conflict("c", "a", 1, b"remote", ("copy", b"local")))
+        self.assertTrue(self.cache.resolve_conflict("c", "a", 0, b"remote", ("copy", b"local")))
+        self.assertEqual(self.item("a"), b"remote")
+        self.assertEqual(self.cache.iter_outbox(5), [("copy", "c", b"local", 0, 0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,198 @@
+import importlib.util
+import itertools
+import os
+import pickle
+import tempfile
+import unittest
+
+
+# An in-memory server with the etag checks of etebase: an item is uploaded on top of the revision it was last
+# saved or fetched at, anything else is rejected as a conflict
+revisions = itertools.count(1)
+
+
+class FakeItem(object):
+    def __init__(self, uid: str, meta: dict, content: bytes):
+        self.uid = uid
+        self.meta = dict(meta)
+        self.deleted = False
+        self.last_etag = None
+        self.set_content(content)
+
+    @property
+    def content(self) -> bytes:
+        return self._content
+
+    @content.setter
+    def content(self, content: bytes):
+        self.set_content(content)
+
+    def set_content(self, content: bytes):
+        self._content = content
+        self.etag = str(next(revisions))
+
+    def delete(self):
+        self.deleted = True
+        self.etag = str(next(revisions))
+
+
+class FakeItemManager(object):
+    def __init__(self, account: "FakeAccount"):
+        self.account = account
+        self.server = account.server
+
+    def create(self, meta: dict, content: bytes) -> FakeItem:
+        return FakeItem(f"item{next(revisions)}", meta, content)
+
+    def fetch(self, uid: str) -> FakeItem:
+        return pickle.loads(pickle.dumps(self.server[uid]))
+
+    def batch(self, items: list):
+        if self.account.offline:
+            raise Exception("Connection refused")
+        if any(item.uid in self.account.failing for item in items):
+            raise Exception("Internal server error")
+        for item in items:
+            if (current := self.server.get(item.uid)) is not None and current.etag != item.last_etag:
+                raise Exception(f"Conflict: wrong etag for {item.uid}")
+        for item in items:
+            item.last_etag = item.etag
+            self.server[item.uid] = pickle.loads(pickle.dumps(item))
+
+    def cache_save(self, item: FakeItem) -> bytes:
+        return pickle.dumps(item)
+
+    def cache_load(self, blob: bytes) -> FakeItem:
+        return pickle.loads(blob)
+
+
+class FakeCollectionManager(object):
+    def __init__(self, account: "FakeAccount"):
+        self.account = account
+
+    def get_item_manager(self, collection: FakeItem) -> FakeItemManager:
+        return FakeItemManager(self.account)
+
+    def cache_save(self, collection: FakeItem) -> bytes:
+        return pickle.dumps(collection)
+
+    def cache_load(self, blob: bytes) -> FakeItem:
+        return pickle.loads(blob)
+
+
+class FakeAccount(object):
+    def __init__(self):
+        self.server = {}
+        self.offline = False
+        self.failing = set()  # uids of items the server fails to store
+
+    def get_collection_manager(self) -> FakeCollectionManager:
+        return FakeCollectionManager(self)
+
+
+@unittest.skipUnless(importlib.util.find_spec("etebase"), "needs etebase")
+class SaveNotesTest(unittest.TestCase):
+    def setUp(self):
+        from pyetenotes.etesync import EtesyncNotes, Notebook
+        self.directory = tempfile.TemporaryDirectory()
+        self.api = EtesyncNotes(os.path.join(self.directory.name, "cache.sqlite"))
+        self.api.etebase = FakeAccount()
+        collection = FakeItem("notebook", {"name": "Notebook", "color": ""}, b"")
+        self.api.cache.save_collections([("notebook", pickle.dumps(collection))])
+        self.notebook = Notebook(collection)
+
+    def tearDown(self):
+        self.api.cache.close()
+        self.directory.cleanup()
+
+    def save(self, note, content: bytes):
+        note.content = content
+        note.changed = True
+        return self.api.save_notes([note])
+
+    def test_create_save_save_again(self):
+        note = self.api.create_note("note", self.notebook)
+        for content in [b"first", b"second"]:
+            saved, queued = self.save(note, content)
+            self.assertEqual((saved, queued), ([note], []))
+            self.assertEqual(self.api.etebase.server[note.uid].content, content)
+        self.assertEqual(self.api.cache.count_outbox(), 0)
+
+    def test_create_save_remove(self):
+        note = self.api.create_note("note", self.notebook)
+        self.save(note, b"first")
+        self.api.remove_note(note)
+        self.assertTrue(self.api.etebase.server[note.uid].deleted)
+        self.assertEqual(self.api.cache.count_outbox(), 0)
+
+    def change_on_server(self, uid: str, content: bytes):
+        item = self.api.etebase.server[uid]
+        item.content = content
+        item.last_etag = item.etag
+
+    def test_queued_change_survives_fetch(self):
+        note = self.api.create_note("note", self.notebook)
+        self.api.etebase.offline = True
+        self.save(note, b"local")
+        self.change_on_server(note.uid, b"remote")
+        item_mgr = self.api.etebase.get_collection_manager().get_item_manager(None)
+        self.api._cache_notes(item_mgr, self.notebook.uid, [item_mgr.fetch(note.uid)])
+        self.assertEqual(self.api.get_cached_note(note.uid, self.notebook).content, b"local")
+
+    def test_conflict_kept_as_copy(self):
+        note = self.api.create_note("note", self.notebook)
+        self.change_on_server(note.uid, b"remote")
+        self.assertEqual(self.save(note, b"local"), ([note], []))
+        self.assertEqual(self.api.cache.count_outbox(), 0)
+        self.assertEqual(self.api.get_cached_note(note.uid, self.notebook).content, b"remote")
+        conflicts, dropped, stuck = self.api.take_outbox_report()
+        self.assertEqual([(conflict.uid, conflict.content) for conflict, _ in conflicts], [(note.uid, b"remote")])
+        copies = [item for uid, item in self.api.etebase.server.items() if uid != note.uid]
+        self.assertEqual([(item.meta["name"], item.content) for item in copies], [(conflicts[0][1], b"local")])
+        self.assertTrue(conflicts[0][1].startswith("note (conflict "))
+        self.assertEqual((dropped, stuck), (0, 0))
+
+    def test_offline_is_no_conflict(self):
+        note = self.api.create_note("note", self.notebook)
+        self.api.etebase.offline = True
+        self.assertEqual(self.save(note, b"local"), ([], [note]))
+        self.assertEqual(self.api.take_outbox_report(), ([], 0, 0))
+        self.api.etebase.offline = False
+        self.api.flush_outbox()
+        self.assertEqual(self.api.etebase.server[note.uid].content, b"local")
+
+    def queue_offline(self, count: int) -> list:
+        notes = [self.api.create_note(f"note {i}", self.notebook) for i in range(count)]
+        self.api.etebase.offline = True
+        for note in notes:
+            self.save(note, note.name.encode())
+        self.api.etebase.offline = False
+        return notes
+
+    def test_flush_partial_failure(self):
+        notes = self.queue_offline(5)
+        self.api.etebase.failing = {notes[1].uid}
+        self.assertEqual(self.api.flush_outbox(), {note.uid for note in notes} - {notes[1].uid})
+        self.assertEqual([row[0] for row in self.api.cache.iter_outbox(1)], [])
+        self.assertEqual([row[0] for row in self.api.cache.iter_outbox(2)], [notes[1].uid])
+        for _ in range(1, 20):
+            self.queue_offline(1)
+            self.api.flush_outbox()
+        self.assertEqual(self.api.take_outbox_report(), ([], 0, 1))
+        self.api.etebase.failing = set()
+        self.save(notes[1], b"again")
+        self.assertEqual(self.api.etebase.server[notes[1].uid].content, b"again")
+        self.assertEqual(self.api.take_outbox_report(), ([], 0, 0))
+
+    def test_flush_failing_server_counts_no_attempts(self):
+        notes = self.queue_offline(5)
+        self.api.etebase.failing = {note.uid for note in notes}
+        self.assertEqual(self.api.flush_outbox(), set())
+        self.assertEqual(len(self.api.cache.iter_outbox(1)), 5)
+        self.api.etebase.failing = set()
+        self.assertEqual(self.api.flush_outbox(), {note.uid for note in notes})
+        self.assertEqual(self.api.cache.count_outbox(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
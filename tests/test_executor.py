@@ -0,0 +1,88 @@
+import threading
+import time
+import unittest
+
+from pyetenotes.executor import Priority, TaskExecutor
+
+
+class RecordingTask(object):
+    priority = Priority.Normal
+
+    def __init__(self, name: str, keys: list, log: list, delay: float = 0):
+        self.name = name
+        self._keys = keys
+        self.log = log
+        self.delay = delay
+
+    def keys(self) -> list:
+        return self._keys
+
+    def cancel(self):
+        pass
+
+    def run(self):
+        self.log.append(("start", self.name))
+        time.sleep(self.delay)
+        self.log.append(("end", self.name))
+        return self.name
+
+
+class TaskExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = TaskExecutor(workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_same_key_in_submission_order(self):
+        log = []
+        # The first task of each key is the slowest, later ones must still wait for it
+        futures = [
+            self.executor.submit(RecordingTask(f"{key}{i}", [key], log, 0.05 if i == 0 else 0))
+            for i in range(5) for key in "ab"
+        ]
+        self.assertEqual([future.result(5) for future in futures], [f"{key}{i}" for i in range(5) for key in "ab"])
+        for key in "ab":
+            events = [(event, name) for event, name in log if name.startswith(key)]
+            self.assertEqual(events, [(event, f"{key}{i}") for i in range(5) for event in ["start", "end"]])
+
+    def test_different_keys_run_concurrently(self):
+        log = []
+        running = threading.Barrier(2, timeout=5)
+        task = RecordingTask("a", ["a"], log)
+        task.run = lambda: running.wait()
+        other = RecordingTask("b", ["b"], log)
+        other.run = lambda: running.wait()
+        futures = [self.executor.submit(task), self.executor.submit(other)]
+        for future in futures:
+            future.result(5)
+
+    def test_task_with_several_keys_waits_for_each(self):
+        log = []
+        futures = [
+            self.executor.submit(RecordingTask("a", ["a"], log, 0.05)),
+            self.executor.submit(RecordingTask("b", ["b"], log, 0.1)),
+            self.executor.submit(RecordingTask("ab", ["a", "b"], log)),
+        ]
+        for future in futures:
+            future.result(5)
+        self.assertEqual(log[-2:], [("start", "ab"), ("end", "ab")])
+
+    def test_failure_releases_key(self):
+        log = []
+        failing = RecordingTask("fail", ["a"], log)
+        failing.run = lambda: 1 / 0
+        futures = [self.executor.submit(failing), self.executor.submit(RecordingTask("next", ["a"], log))]
+        self.assertRaises(ZeroDivisionError, futures[0].result, 5)
+        self.assertEqual(futures[1].result(5), "next")
+
+    def test_queued_tasks_run_on_shutdown(self):
+        log = []
+        futures = [self.executor.submit(RecordingTask(str(i), ["a"], log)) for i in range(10)]
+        self.executor.shutdown()
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertRaises(RuntimeError, self.executor.submit, RecordingTask("late", [], log))
+
+
+if __name__ == "__main__":
+    unittest.main()
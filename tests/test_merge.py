@@ -0,0 +1,92 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from pyetenotes.merge import apply_edits, diff_edits, has_conflicts, merge3, normalize_text
+
+
+CRLF_TEXT = "line1\r\nline2\r\nline3\r\n"
+CRLF_REMOTE = "line1\r\nLINE2\r\nline3\r\n"
+
+
+class DiffEditsTest(unittest.TestCase):
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("a\r\nb\rc d e\xa0f\r\r\ng"), "a\nb\nc\nd\ne f\n\ng")
+
+    def test_crlf(self):
+        base, remote = normalize_text(CRLF_TEXT), normalize_text(CRLF_REMOTE)
+        edits = diff_edits(base, remote)
+        self.assertEqual(edits, [(6, 12, "LINE2\n")])
+        self.assertEqual(apply_edits(base, edits), remote)
+
+    def test_merge3_crlf(self):
+        base, remote = normalize_text(CRLF_TEXT), normalize_text(CRLF_REMOTE)
+        local = "line1\nline2\nline3\nline4\n"
+        edits, conflicts = merge3(base, local, remote)
+        self.assertEqual(conflicts, 0)
+        self.assertEqual(apply_edits(local, edits), "line1\nLINE2\nline3\nline4\n")
+
+    def test_has_conflicts(self):
+        _, conflicts = merge3("line1\n", "local\n", "remote\n")
+        self.assertEqual(conflicts, 1)
+        edits, _ = merge3("line1\n", "local\n", "remote\n")
+        self.assertTrue(has_conflicts(apply_edits("local\n", edits)))
+        self.assertFalse(has_conflicts("local\nremote\n"))
+        self.assertFalse(has_conflicts("quoted <<<<<<< local\n"))
+
+
+@unittest.skipUnless(importlib.util.find_spec("PyQt5") and importlib.util.find_spec("etebase"), "needs PyQt5 and etebase")
+class NoteTabEntryWidgetTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5 import QtCore, QtWidgets
+        # Keep the settings written by the widget out of the user's settings
+        cls.settings_dir = tempfile.TemporaryDirectory()
+        QtCore.QSettings.setPath(QtCore.QSettings.NativeFormat, QtCore.QSettings.UserScope, cls.settings_dir.name)
+        cls.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+        from pyetenotes.gui.MarkdownRenderer import MarkdownRenderer
+        cls.renderer = MarkdownRenderer()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_dir.cleanup()
+
+    def open_widget(self, content: bytes):
+        from pyetenotes.gui.NoteTabEntryWidget import NoteTabEntryWidget
+        note = SimpleNamespace(uid="note", content=content, changed=False, notebook=SimpleNamespace(uid="notebook"))
+        mainwindow = SimpleNamespace(
+            markdown_renderer=self.renderer,
+            autosave_scheduler=SimpleNamespace(edited=lambda: None),
+            notes_tab_widget=SimpleNamespace(currentWidget=lambda: None),
+        )
+        return NoteTabEntryWidget(note, mainwindow)
+
+    def test_update_text_crlf(self):
+        widget = self.open_widget(CRLF_TEXT.encode())
+        widget.update_text(CRLF_REMOTE)
+        self.assertEqual(widget.note_edit_widget.toPlainText(), "line1\nLINE2\nline3\n")
+        self.assertEqual(widget.base_text, "line1\nLINE2\nline3\n")
+        self.assertFalse(widget.is_modified())
+
+    def test_merge_remote_crlf(self):
+        widget = self.open_widget(CRLF_TEXT.encode())
+        from PyQt5 import QtGui
+        text_cursor = QtGui.QTextCursor(widget.note_edit_widget.document())
+        text_cursor.movePosition(QtGui.QTextCursor.End)
+        text_cursor.insertText("line4\n")
+        self.assertEqual(widget.merge_remote(CRLF_REMOTE), 0)
+        self.assertEqual(widget.note_edit_widget.toPlainText(), "line1\nLINE2\nline3\nline4\n")
+
+    def test_replace_ranges_crlf(self):
+        widget = self.open_widget(CRLF_TEXT.encode())
+        text = widget.note_edit_widget.toPlainText()
+        widget.replace_ranges(text, diff_edits(text, normalize_text(CRLF_REMOTE)))
+        self.assertEqual(widget.note_edit_widget.toPlainText(), "line1\nLINE2\nline3\n")
+
+
+if __name__ == "__main__":
+    unittest.main()